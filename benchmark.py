@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cassette import Cassette
+from scheduler import SCHEDULING_POLICIES
+from rate_limiter import ByteBudget
+from summarizer import JobPostingExtractor, RateLimiter, collect_pdf_paths, write_job_details
+
+# The stages every document passes through, in order
+STAGES = ("read", "encode", "serialize", "network", "parse", "write")
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """
+    Computes a percentile by linear interpolation between the closest ranks.
+    Args: values (list): The measurements.
+    fraction (float): The percentile as a fraction, e.g. 0.95.
+    Returns: float | None: The percentile, or None if there are no measurements.
+    """
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_mock(args: argparse.Namespace) -> subprocess.Popen:
+    """
+    Starts mock_openrouter.py in its own process, so its memory and CPU do not count towards the extractor's.
+    Args: args (Namespace): The parsed command line arguments.
+    Returns: Popen: The running mock server. Its endpoint is stored in args.url.
+    """
+
+    command = [sys.executable, "-u", str(Path(__file__).with_name("mock_openrouter.py")),
+               "--port", "0", "--latency", args.latency, "--tokens-per-second", str(args.tokens_per_second),
+               "--prompt-tokens-per-second", str(args.prompt_tokens_per_second),
+               "--default-model-dir", args.default_model_dir]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    mock = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # The first line announces the endpoint once the server is listening
+    first_line = mock.stdout.readline()
+    if not first_line.startswith("Mock OpenRouter listening on "):
+        mock.kill()
+        raise RuntimeError(f"The mock server did not start: {first_line!r}")
+    args.url = first_line.rsplit(" ", 1)[1].strip()
+    return mock
+
+
+def run_once(args: argparse.Namespace, pdf_paths: List[str], output_dir: str) -> dict:
+    """
+    Extracts every PDF once without the response cache and measures each stage.
+    Args: args (Namespace): The parsed command line arguments.
+    pdf_paths (list): The PDFs to extract.
+    output_dir (str): The directory the outputs are written to.
+    Returns: dict: The per-document metadata and the wall time of the run.
+    """
+
+    documents: Dict[str, dict] = {}
+
+    def on_result(pdf_path: str, job_details: Optional[str], metadata: dict):
+        # Includes the time spent waiting for a turn, which the schedule decides
+        metadata["completed_seconds"] = time.perf_counter() - batch_started
+        if job_details is not None:
+            started = time.perf_counter()
+            write_job_details(pdf_path, job_details, output_dir)
+            metadata.setdefault("timings", {})["write"] = time.perf_counter() - started
+        metadata["ok"] = job_details is not None
+        documents[pdf_path] = metadata
+
+    extractor = JobPostingExtractor(model_name=args.model, pool_size=max(10, args.concurrency),
+                                    pdf_engine=args.pdf_engine, stream=args.stream,
+                                    structured_output=args.structured_output, schedule=args.schedule,
+                                    byte_budget=ByteBudget(int(args.max_inflight_mb * 1024 * 1024))
+                                    if args.max_inflight_mb else None,
+                                    rate_limiter=RateLimiter(initial_concurrency=args.concurrency,
+                                                             max_concurrency=args.concurrency),
+                                    cassette=Cassette(args.cassette, "replay") if args.cassette else None)
+    with extractor:
+        started = batch_started = time.perf_counter()
+        asyncio.run(extractor.extract_many(pdf_paths, concurrency=args.concurrency, on_result=on_result))
+        wall_seconds = time.perf_counter() - started
+    return {"documents": documents, "wall_seconds": wall_seconds}
+
+
+def summarize(runs: List[dict], pdf_paths: List[str]) -> dict:
+    """
+    Aggregates the measurements of all runs.
+    Args: runs (list): The results of run_once.
+    pdf_paths (list): The PDFs extracted in each run.
+    Returns: dict: Stage timings, throughput and latency percentiles.
+    """
+
+    input_bytes = sum(os.path.getsize(pdf_path) for pdf_path in pdf_paths)
+    wall_seconds = sum(run["wall_seconds"] for run in runs)
+    documents = [metadata for run in runs for metadata in run["documents"].values()]
+    succeeded = [metadata for metadata in documents if metadata.get("ok")]
+    latencies = [metadata["timings"]["total"] for metadata in succeeded if "total" in metadata.get("timings", {})]
+    completions = [metadata["completed_seconds"] for metadata in succeeded if "completed_seconds" in metadata]
+    completion_tokens = [metadata["usage"]["completion_tokens"] for metadata in succeeded
+                         if "completion_tokens" in metadata.get("usage", {})]
+
+    stages = {}
+    for stage in STAGES:
+        values = [metadata.get("timings", {}).get(stage, 0.0) for metadata in succeeded]
+        stages[stage] = {
+            "total_seconds": sum(values),
+            "mean_seconds": sum(values) / len(values) if values else None,
+        }
+
+    return {
+        "documents": len(documents),
+        "failed": len(documents) - len(succeeded),
+        "input_bytes": input_bytes * len(runs),
+        "wall_seconds": wall_seconds,
+        "docs_per_second": len(succeeded) / wall_seconds if wall_seconds else None,
+        "mb_per_second": input_bytes * len(runs) / (1024 * 1024) / wall_seconds if wall_seconds else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+        },
+        "completed_seconds": {
+            "mean": sum(completions) / len(completions) if completions else None,
+            "p50": percentile(completions, 0.50),
+            "p95": percentile(completions, 0.95),
+        },
+        "completion_tokens": {
+            "total": sum(completion_tokens),
+            "mean": sum(completion_tokens) / len(completion_tokens) if completion_tokens else None,
+        },
+        "stages": stages,
+    }
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the extractor end to end over the Input corpus.")
+    parser.add_argument("target", nargs="?", default="Input", help="A PDF file, a directory of PDFs, or a glob pattern (default: Input)")
+    parser.add_argument("--url", default=None,
+                        help="Chat completions endpoint to benchmark against (default: a mock server replaying the recorded outputs)")
+    parser.add_argument("--cassette", default=None,
+                        help="Replay responses recorded with summarizer.py --cassette instead of calling a server")
+    parser.add_argument("--model", default="openai/gpt-4o", help="Model to request (default: openai/gpt-4o)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of requests kept in flight (default: 4)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of passes over the corpus (default: 3)")
+    parser.add_argument("--warmup", type=int, default=1, help="Passes run before measuring (default: 1)")
+    parser.add_argument("--stream", action="store_true", help="Benchmark streaming completions")
+    parser.add_argument("--pdf-engine", default=None, help="PDF engine to request")
+    parser.add_argument("--structured-output", action="store_true",
+                        help="Constrain answers with a JSON-schema response_format, to compare against the prompt alone")
+    parser.add_argument("--schedule", choices=SCHEDULING_POLICIES, default="fifo", help="Request order (default: fifo)")
+    parser.add_argument("--max-inflight-mb", type=float, default=None, help="Byte budget of payloads in flight, in MB")
+    parser.add_argument("--latency", default="fixed:0", help="Mock time to first byte, see mock_openrouter.py (default: fixed:0)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Mock completion pace, 0 for instant")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0,
+                        help="Mock pace of reading the request, so large PDFs take longer, 0 for instant")
+    parser.add_argument("--default-model-dir", default="Output (openai_gpt-4o)",
+                        help="Recorded outputs the mock replays for models without their own directory")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the mock server")
+    parser.add_argument("--output-dir", default=".cache/benchmark", help="Directory the outputs are written to")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file instead of stdout")
+    return parser
+
+
+if __name__ == "__main__":
+    args = _build_arg_parser().parse_args()
+    pdf_paths = collect_pdf_paths(args.target)
+    if not pdf_paths:
+        print(f"Error: no PDF files found for '{args.target}'")
+        sys.exit(1)
+
+    mock = start_mock(args) if args.url is None and args.cassette is None else None
+    if args.url is not None:
+        os.environ["OPENROUTER_API_URL"] = args.url
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    try:
+        for _ in range(args.warmup):
+            run_once(args, pdf_paths, args.output_dir)
+        runs = [run_once(args, pdf_paths, args.output_dir) for _ in range(args.repeat)]
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "target": args.target,
+            "url": "mock" if mock is not None else args.url,
+            "cassette": args.cassette,
+            "model": args.model,
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "stream": args.stream,
+            "structured_output": args.structured_output,
+            "schedule": args.schedule,
+            "max_inflight_mb": args.max_inflight_mb,
+            "pdf_engine": args.pdf_engine,
+            "latency": args.latency if mock is not None else None,
+        },
+        "results": summarize(runs, pdf_paths),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
@@ -0,0 +1,208 @@
+import io
+import os
+import gzip
+import json
+import hashlib
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+from rate_limiter import RETRYABLE_STATUS_CODES
+
+CASSETTE_MODES = ("record", "replay", "auto")
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """
+    Raised in replay mode for a request that was never recorded
+    """
+
+
+class Cassette:
+    """
+    An on-disk store of raw OpenRouter responses, one gzipped file per request fingerprint
+    """
+
+    def __init__(self, cassette_dir: str = ".cache/cassette", mode: str = "auto"):
+        """
+        Initializes the Cassette.
+        Args: cassette_dir (str): The directory the recorded responses are stored in.
+        mode (str): "record" to always call the API and store the responses, "replay" to only serve
+        stored responses without any network I/O, or "auto" to replay what is stored and record the rest.
+        """
+
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {', '.join(CASSETTE_MODES)}.")
+        self.cassette_dir = Path(cassette_dir)
+        self.mode = mode
+        self.replayed = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cassette_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(method: str, url: str, body_chunks) -> str:
+        """
+        Identifies a request by its method, URL path and body. The host is left out, so responses recorded
+        against a local server on any port replay anywhere, and so are the headers, including the API key.
+        Args: method (str): The HTTP method.
+        url (str): The request URL.
+        body_chunks (Iterable[bytes]): The request body, in one or more pieces.
+        Returns: str: The hex digest identifying the request.
+        """
+
+        digest = Cassette.start_fingerprint(method, url)
+        for chunk in body_chunks:
+            digest.update(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def start_fingerprint(method: str, url: str):
+        """
+        Returns a sha256 object seeded with the method and URL path, for bodies hashed as they are sent.
+        """
+
+        parts = urlsplit(url)
+        return hashlib.sha256(f"{method} {parts.path}?{parts.query}\n".encode("utf-8"))
+
+    def _entry_path(self, fingerprint: str) -> Path:
+        return self.cassette_dir / f"{fingerprint}.json.gz"
+
+    def load(self, fingerprint: str) -> Optional[dict]:
+        """
+        Looks up a recorded response.
+        Args: fingerprint (str): The request fingerprint.
+        Returns: dict | None: The status, headers and body of the response, or None if it was not recorded.
+        """
+
+        try:
+            with gzip.open(self._entry_path(fingerprint), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, EOFError, OSError, json.JSONDecodeError):
+            return None
+        with self._lock:
+            self.replayed += 1
+        return entry
+
+    def save(self, fingerprint: str, method: str, url: str, status: int, headers: dict, body: bytes):
+        """
+        Stores a response.
+        Args: fingerprint (str): The request fingerprint.
+        method (str): The HTTP method, kept for reference.
+        url (str): The request URL, kept for reference.
+        status (int): The HTTP status code.
+        headers (dict): The response headers.
+        body (bytes): The decoded response body.
+        """
+
+        entry = {
+            "request": {"method": method, "url": url},
+            "status": status,
+            "headers": headers,
+            # surrogateescape keeps bodies that are not valid UTF-8 intact
+            "body": body.decode("utf-8", "surrogateescape"),
+        }
+        entry_path = self._entry_path(fingerprint)
+        tmp_path = entry_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+        with self._lock:
+            self.recorded += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the number of responses replayed and recorded so far.
+        """
+
+        with self._lock:
+            return {"replayed": self.replayed, "recorded": self.recorded}
+
+
+class _HashingBody:
+    """
+    Passes a request body through to the connection while hashing it, so recording costs no extra pass
+    """
+
+    def __init__(self, body, digest):
+        self.body = body
+        self.digest = digest
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.digest.update(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            yield chunk
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    A transport adapter that records responses to a Cassette or replays them instead of calling the API
+    """
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        """
+        Initializes the CassetteAdapter.
+        Args: cassette (Cassette): The store to record to and replay from.
+        kwargs: The HTTPAdapter settings, such as pool_maxsize.
+        """
+
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs) -> requests.Response:
+        if request.method == "HEAD":
+            # Connection warm-up has nothing worth recording
+            if self.cassette.mode == "replay":
+                return self._build(request, 200, {"Content-Length": "0"}, b"")
+            return super().send(request, stream=stream, **kwargs)
+
+        body = request.body
+        if body is None or isinstance(body, (bytes, str)):
+            fingerprint = Cassette.fingerprint(request.method, request.url, [body or b""])
+        else:
+            fingerprint = None
+
+        if self.cassette.mode != "record":
+            if fingerprint is None:
+                # Streamed bodies are only hashed here when a replay is possible, recording hashes them in flight
+                fingerprint = Cassette.fingerprint(request.method, request.url, body)
+            entry = self.cassette.load(fingerprint)
+            if entry is not None:
+                return self._build(request, entry["status"], entry["headers"],
+                                   entry["body"].encode("utf-8", "surrogateescape"))
+            if self.cassette.mode == "replay":
+                raise CassetteMiss(f"No recorded response for request {fingerprint[:12]}", request=request)
+
+        digest = None
+        if fingerprint is None:
+            digest = Cassette.start_fingerprint(request.method, request.url)
+            request.body = _HashingBody(body, digest)
+        try:
+            response = super().send(request, stream=True, **kwargs)
+        finally:
+            request.body = body
+        if digest is not None:
+            fingerprint = digest.hexdigest()
+
+        # Streamed completions are read in full before they are handed on, so a recorded run does not stream
+        content = response.content
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+        # Throttles and transient failures would only replay the same failure
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            self.cassette.save(fingerprint, request.method, request.url, response.status_code, headers, content)
+        return self._build(request, response.status_code, headers, content)
+
+    def _build(self, request: requests.PreparedRequest, status: int, headers: dict, body: bytes) -> requests.Response:
+        headers = dict(headers, **{"Content-Length": str(len(body))})
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status,
+                           preload_content=False, decode_content=False, request_url=request.url)
+        return self.build_response(request, raw)
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import socket
+import getpass
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+# Only the standard library is imported here, so a call costs an interpreter start and nothing more
+
+
+def default_socket_path() -> str:
+    """
+    Returns the socket the extraction daemon listens on unless told otherwise: $JOBSUMMARIZER_SOCKET,
+    or a per-user socket in the temporary directory.
+    """
+
+    # Not every platform has user ids, the user name keeps the socket per user there
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.getenv("JOBSUMMARIZER_SOCKET") or os.path.join(tempfile.gettempdir(), f"jobsummarizer-{user}.sock")
+
+
+def request_extraction(target: str, output_dir: str = "Output", socket_path: Optional[str] = None,
+                       timeout: Optional[float] = None) -> int:
+    """
+    Asks a running daemon (`summarizer.py --serve`) to extract job details, printing the same lines
+    the command line tool prints.
+    Args: target (str): A PDF file, a directory of PDFs, or a glob pattern, relative to the working directory.
+    output_dir (str): The directory the JSON outputs are written to, relative to the working directory.
+    socket_path (str | None): The daemon's socket, defaulting to default_socket_path().
+    timeout (float | None): How long to wait for the daemon without hearing from it, or None to wait indefinitely.
+    Returns: int: The exit status of the equivalent summarizer.py call.
+    Raises: OSError: If no daemon is listening on the socket.
+    """
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path or default_socket_path())
+        # The daemon runs in a directory of its own, so it is told which one the paths are relative to
+        request = {"target": target, "output_dir": output_dir, "cwd": os.getcwd()}
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        with connection.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if reply.get("message") is not None:
+                    print(reply["message"])
+                if reply.get("event") == "done":
+                    return reply.get("status", 0)
+    finally:
+        connection.close()
+    print("Error: the extraction daemon closed the connection before finishing.")
+    return 1
+
+
+def _run_summarizer(argv: List[str]) -> int:
+    # Without a daemon the command line tool does the work itself, so callers get the same result either way
+    return subprocess.call([sys.executable, str(Path(__file__).with_name("summarizer.py"))] + argv)
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Extract job posting details through a running extraction daemon (summarizer.py --serve), "
+                    "with the same arguments and output as summarizer.py. Any other summarizer.py option, or a missing "
+                    "daemon, runs summarizer.py itself.")
+    parser.add_argument("target", help="A PDF file, a directory of PDFs, or a glob pattern such as 'Input/*.pdf'")
+    parser.add_argument("--output-dir", default="Output", help="Directory the JSON outputs are written to (default: Output)")
+    parser.add_argument("--socket", default=None, help="The daemon's socket (default: $JOBSUMMARIZER_SOCKET or a per-user socket)")
+    return parser
+
+
+if __name__ == "__main__":
+    args, extra = _build_arg_parser().parse_known_args()
+    argv = [args.target, "--output-dir", args.output_dir] + extra
+    if extra or not hasattr(socket, "AF_UNIX"):
+        # Extraction options are fixed when the daemon starts, and without Unix sockets there is no daemon
+        sys.exit(_run_summarizer(argv))
+    try:
+        sys.exit(request_extraction(args.target, args.output_dir, args.socket))
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(_run_summarizer(argv))
@@ -0,0 +1,219 @@
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PENDING = "pending"
+IN_FLIGHT = "in-flight"
+DONE = "done"
+FAILED = "failed"
+
+# Limit a query on jobs to those enqueued through the connection, the first taking the model as a parameter
+_IN_SCOPE = "pdf_path IN (SELECT pdf_path FROM run_scope WHERE model = ?)"
+_ENQUEUED = "EXISTS (SELECT 1 FROM run_scope WHERE run_scope.pdf_path = jobs.pdf_path AND run_scope.model = jobs.model)"
+
+
+class JobQueue:
+    """
+    A local SQLite-backed work queue of extraction jobs, one row per PDF and model, that survives crashes and restarts
+    """
+
+    def __init__(self, db_path: str = "extraction_queue.db", lease_seconds: float = 900):
+        """
+        Initializes the JobQueue.
+        Args: db_path (str): The path to the SQLite database file.
+        lease_seconds (float): How long a claimed job may stay in flight before another worker may reclaim it.
+        """
+
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        # Autocommit mode, transactions are opened explicitly where several statements must apply together
+        self._connection = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                pdf_path TEXT NOT NULL,
+                model TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_expires REAL,
+                reason TEXT,
+                output_path TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (pdf_path, model)
+            )
+            """
+        )
+        # The jobs enqueued through this connection, so a run only works on its own target and not on everything
+        # earlier runs left in the database. Temporary tables live as long as the connection.
+        self._connection.execute("CREATE TEMP TABLE run_scope (pdf_path TEXT NOT NULL, model TEXT NOT NULL, "
+                                 "PRIMARY KEY (pdf_path, model))")
+
+    def enqueue(self, pdf_paths: Iterable[str], model: str, resume: bool = False):
+        """
+        Adds PDFs to the queue for a model. Only the PDFs enqueued through this JobQueue are claimed from it.
+        Args: pdf_paths (Iterable[str]): The paths to the PDF files.
+        model (str): The model the PDFs are extracted with.
+        resume (bool): Whether to keep finished work and only requeue failed jobs and the jobs a stopped run left
+        in flight. Otherwise every job starts over. Resuming takes over every lease, so the earlier run must have stopped.
+        """
+
+        now = time.time()
+        rows = [(pdf_path, model, PENDING, now) for pdf_path in pdf_paths]
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO jobs (pdf_path, model, state, updated) VALUES (?, ?, ?, ?)", rows)
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO run_scope (pdf_path, model) VALUES (?, ?)",
+                    [(pdf_path, model) for pdf_path, _, _, _ in rows])
+                if resume:
+                    # A killed run cannot finish its jobs, waiting for their leases to run out would only stall this one
+                    self._connection.executemany(
+                        "UPDATE jobs SET state = ?, lease_expires = NULL, updated = ? "
+                        "WHERE pdf_path = ? AND model = ? AND state IN (?, ?)",
+                        [(PENDING, now, pdf_path, model, FAILED, IN_FLIGHT) for pdf_path, _, _, _ in rows])
+                else:
+                    self._connection.executemany(
+                        "UPDATE jobs SET state = ?, attempts = 0, lease_expires = NULL, reason = NULL, updated = ? "
+                        "WHERE pdf_path = ? AND model = ?",
+                        [(PENDING, now, pdf_path, model) for pdf_path, _, _, _ in rows])
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def claim(self, model: str) -> Optional[Tuple[str, int]]:
+        """
+        Takes the next pending job for a model among those enqueued through this JobQueue and leases it,
+        first reclaiming jobs whose lease has run out.
+        Args: model (str): The model to take a job for.
+        Returns: tuple | None: The path of the claimed PDF and the lease, to be passed to complete or fail,
+        or None if no job is pending. Jobs may still be in flight then, see next_lease_expiry.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                # A worker that crashed or was killed leaves its jobs in flight until the lease runs out
+                self._connection.execute(
+                    "UPDATE jobs SET state = ?, lease_expires = NULL, updated = ? "
+                    f"WHERE model = ? AND state = ? AND lease_expires < ? AND {_IN_SCOPE}",
+                    (PENDING, now, model, IN_FLIGHT, now, model))
+                row = self._connection.execute(
+                    "SELECT pdf_path, attempts + 1 FROM jobs "
+                    f"WHERE model = ? AND state = ? AND {_IN_SCOPE} ORDER BY rowid LIMIT 1",
+                    (model, PENDING, model)).fetchone()
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_expires = ?, updated = ? "
+                        "WHERE pdf_path = ? AND model = ?",
+                        (IN_FLIGHT, now + self.lease_seconds, now, row[0], model))
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return (row[0], row[1]) if row is not None else None
+
+    def next_lease_expiry(self, model: str) -> Optional[float]:
+        """
+        Tells when the first lease of a model's jobs in flight runs out, after which claim may hand the job out again.
+        Only the jobs enqueued through this JobQueue count.
+        Args: model (str): The model whose jobs to check.
+        Returns: float | None: The time.time() at which it runs out, or None if no job is in flight.
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT MIN(lease_expires) FROM jobs WHERE model = ? AND state = ? AND {_IN_SCOPE}",
+                (model, IN_FLIGHT, model)).fetchone()
+        return row[0]
+
+    def complete(self, pdf_path: str, model: str, output_path: Optional[str] = None,
+                 lease: Optional[int] = None) -> bool:
+        """
+        Marks a job as done.
+        Args: pdf_path (str): The path of the PDF.
+        model (str): The model the PDF was extracted with.
+        output_path (str | None): Where the result was written.
+        lease (int | None): The lease returned by claim. If given, the job is only marked while the lease is still held.
+        Returns: bool: Whether the job was marked, False if it was reclaimed and handed out again meanwhile.
+        """
+
+        return self._finish(pdf_path, model, DONE, None, output_path, lease)
+
+    def fail(self, pdf_path: str, model: str, reason: str, lease: Optional[int] = None) -> bool:
+        """
+        Marks a job as failed.
+        Args: pdf_path (str): The path of the PDF.
+        model (str): The model the PDF was extracted with.
+        reason (str): Why the extraction failed.
+        lease (int | None): The lease returned by claim. If given, the job is only marked while the lease is still held.
+        Returns: bool: Whether the job was marked, False if it was reclaimed and handed out again meanwhile.
+        """
+
+        return self._finish(pdf_path, model, FAILED, reason, None, lease)
+
+    def _finish(self, pdf_path: str, model: str, state: str, reason: Optional[str], output_path: Optional[str],
+                lease: Optional[int] = None) -> bool:
+        query = ("UPDATE jobs SET state = ?, lease_expires = NULL, reason = ?, output_path = ?, updated = ? "
+                 "WHERE pdf_path = ? AND model = ?")
+        params: tuple = (state, reason, output_path, time.time(), pdf_path, model)
+        if lease is not None:
+            # Every claim counts an attempt, so a job handed out again since no longer matches the old lease
+            query += " AND state = ? AND attempts = ?"
+            params += (IN_FLIGHT, lease)
+        with self._lock:
+            return self._connection.execute(query, params).rowcount > 0
+
+    def counts(self, model: Optional[str] = None, enqueued_only: bool = False) -> Dict[str, int]:
+        """
+        Counts the jobs in each state.
+        Args: model (str | None): Only count the jobs of this model.
+        enqueued_only (bool): Only count the jobs enqueued through this JobQueue, e.g. to summarize a run.
+        Returns: dict: The number of jobs per state.
+        """
+
+        conditions = []
+        params: tuple = ()
+        if model is not None:
+            conditions.append("model = ?")
+            params = (model,)
+        if enqueued_only:
+            conditions.append(_ENQUEUED)
+        query = "SELECT state, COUNT(*) FROM jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            rows = self._connection.execute(query + " GROUP BY state", params).fetchall()
+        return {state: count for state, count in rows}
+
+    def failures(self, model: Optional[str] = None, enqueued_only: bool = False) -> List[tuple]:
+        """
+        Lists the failed jobs and why they failed.
+        Args: model (str | None): Only list the jobs of this model.
+        enqueued_only (bool): Only list the jobs enqueued through this JobQueue.
+        Returns: list: (pdf_path, model, reason) tuples.
+        """
+
+        query = "SELECT pdf_path, model, reason FROM jobs WHERE state = ?"
+        params: tuple = (FAILED,)
+        if model is not None:
+            query += " AND model = ?"
+            params += (model,)
+        if enqueued_only:
+            query += f" AND {_ENQUEUED}"
+        with self._lock:
+            return self._connection.execute(query, params).fetchall()
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+
+        with self._lock:
+            self._connection.close()
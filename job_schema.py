@@ -0,0 +1,328 @@
+import re
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+# orjson parses several times faster, but the standard library parser works the same without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# A fenced code block, optionally tagged as JSON, anywhere in the answer
+_FENCE = re.compile(r"```[ \t]*(?:json|JSON)?[ \t]*\r?\n?(.*?)```", re.S)
+# A comma right before a closing bracket or brace, which JSON does not allow
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+
+
+def orjson_available() -> bool:
+    """
+    Returns whether orjson is installed and used for parsing.
+    """
+
+    return orjson is not None
+
+
+def loads(text: str) -> Any:
+    """
+    Parses JSON with orjson when it is available.
+    Args: text (str): The JSON text.
+    Returns: Any: The parsed value.
+    Raises: json.JSONDecodeError: If the text is not valid JSON. orjson's error is a subclass of it.
+    """
+
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def slice_json(content: str) -> str:
+    """
+    Cuts the JSON value out of a model answer: the inside of a code fence if there is one,
+    then everything from the first opening bracket or brace to the matching last closing one.
+    Args: content (str): The model's answer.
+    Returns: str: The JSON text, possibly still invalid or cut off, or an empty string if there is none.
+    """
+
+    fenced = _FENCE.search(content)
+    if fenced:
+        content = fenced.group(1)
+    elif content.lstrip().startswith("```"):
+        # An answer cut off before its closing fence
+        content = content.lstrip()[3:]
+
+    starts = [index for index in (content.find("["), content.find("{")) if index >= 0]
+    if not starts:
+        return ""
+    start = min(starts)
+    end = content.rfind("]" if content[start] == "[" else "}")
+    if end < start:
+        return content[start:]
+    return content[start:end + 1]
+
+
+class IncrementalJobArrayParser:
+    """
+    Picks complete job objects out of a JSON array while it is still arriving, one object per closing brace
+    """
+
+    def __init__(self):
+        self.jobs: List[dict] = []
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current: List[str] = []
+
+    def feed(self, text: str) -> List[dict]:
+        """
+        Consumes the next piece of the model's answer.
+        Args: text (str): The newly arrived text.
+        Returns: list: The job objects completed by this piece, in order.
+        """
+
+        completed = []
+        for char in text:
+            if self._finished:
+                break
+            if not self._in_array:
+                # Anything before the array, such as a code fence, is skipped
+                if char == "[":
+                    self._in_array = True
+                continue
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._current = [char]
+                elif char == "]":
+                    self._finished = True
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        job = loads("".join(self._current))
+                    except json.JSONDecodeError:
+                        continue
+                    self.jobs.append(job)
+                    completed.append(job)
+        return completed
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the closing bracket of the array has been seen.
+        """
+
+        return self._finished
+
+
+def parse_job_fragment(content: str, wrapper_key: str = "jobs") -> List[dict]:
+    """
+    Picks the complete job objects out of the continuation of a cut off answer. A model may pick up right where
+    the array stopped (", {...}]"), restate the remaining jobs as an array of their own, or wrap them in an object.
+    Args: content (str): The continuation.
+    wrapper_key (str): The key holding the array when it is wrapped in an object.
+    Returns: list: The complete job objects, in order.
+    """
+
+    fenced = _FENCE.search(content)
+    if fenced:
+        text = fenced.group(1)
+    else:
+        # A continuation cut off again has no closing fence
+        text = re.sub(r"^```[ \t]*(?:json|JSON)?", "", content.lstrip())
+    text = text.strip().lstrip(",").lstrip()
+
+    try:
+        data = loads(text)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, dict):
+        data = data[wrapper_key] if list(data) == [wrapper_key] else [data]
+    if isinstance(data, list):
+        return [job for job in data if isinstance(job, dict)]
+
+    parser = IncrementalJobArrayParser()
+    if text.startswith("[") or re.match(r'\{\s*"%s"\s*:' % re.escape(wrapper_key), text):
+        parser.feed(text)
+    else:
+        parser.feed("[" + text)
+    return parser.jobs
+
+
+def repair_json(text: str) -> Tuple[Optional[Any], List[str]]:
+    """
+    Tries the targeted repairs for the ways model answers usually break: trailing commas, and an array cut off
+    part way, of which the complete objects are kept.
+    Args: text (str): The JSON text that failed to parse.
+    Returns: tuple: The parsed value, or None if no repair helped, and the repairs applied.
+    """
+
+    without_commas = _TRAILING_COMMA.sub(r"\1", text)
+    if without_commas != text:
+        try:
+            return loads(without_commas), ["removed trailing commas"]
+        except json.JSONDecodeError:
+            pass
+
+    if text.lstrip().startswith("["):
+        parser = IncrementalJobArrayParser()
+        parser.feed(without_commas)
+        if parser.jobs and not parser.finished:
+            return parser.jobs, [f"kept the {len(parser.jobs)} complete jobs of a cut off array"]
+    return None, []
+
+
+class JobSchema:
+    """
+    A validator for job arrays, compiled once from the list of fields every job object must carry
+    """
+
+    def __init__(self, fields: Iterable[str], missing_value: str = "not mentioned", wrapper_key: str = "jobs"):
+        """
+        Initializes the JobSchema.
+        Args: fields (Iterable[str]): The fields of a job object, in output order.
+        missing_value (str): The value of a field the answer leaves out.
+        wrapper_key (str): The key holding the array when it is wrapped in an object, as JSON-schema answers are.
+        """
+
+        self.fields = tuple(fields)
+        self.missing_value = missing_value
+        self.wrapper_key = wrapper_key
+        # Keys are matched ignoring case, spaces and punctuation, so "company_name" still fills "Company name"
+        self._lookup = {self._normalize_key(field): field for field in self.fields}
+
+    @staticmethod
+    def _normalize_key(key: str) -> str:
+        return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+    def validate(self, data: Any) -> Tuple[Optional[List[dict]], List[str], List[str]]:
+        """
+        Checks a parsed answer against the schema and normalizes it: every job object gets every field,
+        in schema order, followed by any extra fields. Structured values such as reservation breakdowns are kept.
+        Items that are not job objects are dropped and reported as errors, the rest of the array is still used.
+        Args: data (Any): The parsed answer.
+        Returns: tuple: The normalized jobs, or None if the answer does not fit the schema or none of its items
+        is a job, the repairs applied, and the errors found.
+        """
+
+        repairs: List[str] = []
+        if isinstance(data, dict) and list(data) == [self.wrapper_key]:
+            data = data[self.wrapper_key]
+        elif isinstance(data, dict):
+            lists = [value for value in data.values() if isinstance(value, list)]
+            if len(lists) == 1 and not any(self._normalize_key(key) in self._lookup for key in data):
+                data = lists[0]
+                repairs.append("unwrapped the job array from an object")
+            else:
+                data = [data]
+                repairs.append("wrapped a single job object in an array")
+        if not isinstance(data, list):
+            return None, repairs, [f"expected a JSON array of jobs, got {type(data).__name__}"]
+
+        jobs = []
+        errors = []
+        renamed = filled = 0
+        for index, item in enumerate(data, start=1):
+            if not isinstance(item, dict):
+                errors.append(f"job {index} is a {type(item).__name__}, not an object")
+                continue
+
+            job = {}
+            extra = {}
+            for key, value in item.items():
+                field = self._lookup.get(self._normalize_key(key))
+                if field is None:
+                    extra[key] = value
+                    continue
+                renamed += field != key
+                if value is None:
+                    value = self.missing_value
+                job[field] = value.strip() if isinstance(value, str) else value
+            if not job:
+                errors.append(f"job {index} has none of the expected fields")
+                continue
+
+            filled += len(self.fields) - len(job)
+            job = {field: job.get(field, self.missing_value) for field in self.fields}
+            job.update(extra)
+            jobs.append(job)
+
+        if renamed:
+            repairs.append(f"renamed {renamed} fields")
+        if filled:
+            repairs.append(f"filled {filled} missing fields")
+        if errors and not jobs:
+            return None, repairs, errors
+        if errors:
+            repairs.append(f"dropped {len(errors)} of {len(data)} items that are not jobs")
+        return jobs, repairs, errors
+
+    def response_format(self, name: str = "job_postings") -> dict:
+        """
+        Builds the OpenAI-style response_format that constrains an answer to this schema. Strict JSON schemas
+        need an object at the top, so the array is wrapped under wrapper_key, and every field is a string.
+        Args: name (str): The name of the schema.
+        Returns: dict: The response_format request parameter.
+        """
+
+        job = {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in self.fields},
+            "required": list(self.fields),
+            "additionalProperties": False,
+        }
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": name,
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {self.wrapper_key: {"type": "array", "items": job}},
+                    "required": [self.wrapper_key],
+                    "additionalProperties": False,
+                },
+            },
+        }
+
+    def parse(self, content: Optional[str]) -> Tuple[Optional[List[dict]], dict]:
+        """
+        Extracts, parses, repairs and validates the job array in a model answer.
+        Args: content (str | None): The model's answer.
+        Returns: tuple: The normalized jobs, or None if the answer is unusable,
+        and a report of the repairs applied and the errors found.
+        """
+
+        if not isinstance(content, str) or not content.strip():
+            return None, {"repairs": [], "errors": ["empty answer"]}
+
+        text = slice_json(content)
+        if not text:
+            return None, {"repairs": [], "errors": ["no JSON in the answer"]}
+        # Code fences and stray prose around the JSON are routine and not counted as repairs
+        repairs = []
+        try:
+            data = loads(text)
+        except json.JSONDecodeError as e:
+            data, json_repairs = repair_json(text)
+            if data is None:
+                return None, {"repairs": repairs, "errors": [f"invalid JSON: {e}"]}
+            repairs += json_repairs
+
+        jobs, schema_repairs, errors = self.validate(data)
+        return jobs, {"repairs": repairs + schema_repairs, "errors": errors}
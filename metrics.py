@@ -0,0 +1,155 @@
+import os
+import json
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# The fields of the record handed to the extractor's on_request hook, one record per OpenRouter call
+REQUEST_METRIC_FIELDS = (
+    "started", "model", "documents", "status", "error", "retries", "wall_seconds",
+    "request_bytes", "response_bytes", "generation_id", "finish_reason",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cost",
+)
+
+# Upper bounds of the request duration histogram in seconds
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def fan_out(callbacks: Iterable[Optional[Callable[[dict], None]]]) -> Optional[Callable[[dict], None]]:
+    """
+    Combines several metrics callbacks into one.
+    Args: callbacks (Iterable): The callbacks, None entries are skipped.
+    Returns: Callable | None: A callback calling each of them in turn, or None if there are none.
+    """
+
+    callbacks = [callback for callback in callbacks if callback is not None]
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def call_all(record: dict):
+        for callback in callbacks:
+            callback(record)
+    return call_all
+
+
+class JsonlMetricsWriter:
+    """
+    A metrics callback that appends every request record to a JSONL file
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the JsonlMetricsWriter.
+        Args: path (str): The file the records are appended to.
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class PrometheusTextfileWriter:
+    """
+    A metrics callback that keeps per-model totals and rewrites them in the Prometheus text format
+    after every request, for the node_exporter textfile collector
+    """
+
+    def __init__(self, path: str, prefix: str = "jobsummarizer"):
+        """
+        Initializes the PrometheusTextfileWriter.
+        Args: path (str): The .prom file to write.
+        prefix (str): The prefix of every metric name.
+        """
+
+        self.path = path
+        self.prefix = prefix
+        self._requests: Dict[Tuple[str, str], int] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._durations: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _add(self, name: str, labels: Dict[str, str], amount: Optional[float]):
+        if amount is None:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def __call__(self, record: dict):
+        model = record.get("model") or ""
+        status = str(record.get("status") or "error")
+        with self._lock:
+            self._requests[(model, status)] = self._requests.get((model, status), 0) + 1
+            self._add("request_retries_total", {"model": model}, record.get("retries"))
+            self._add("request_bytes_total", {"model": model, "direction": "sent"}, record.get("request_bytes"))
+            self._add("request_bytes_total", {"model": model, "direction": "received"}, record.get("response_bytes"))
+            self._add("tokens_total", {"model": model, "type": "prompt"}, record.get("prompt_tokens"))
+            self._add("tokens_total", {"model": model, "type": "completion"}, record.get("completion_tokens"))
+            self._add("cost_total", {"model": model}, record.get("cost"))
+
+            # Cumulative bucket counts followed by the sum and the count of all durations
+            histogram = self._durations.setdefault(model, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+            wall_seconds = record.get("wall_seconds")
+            if wall_seconds is not None:
+                for index, bound in enumerate(DURATION_BUCKETS):
+                    if wall_seconds <= bound:
+                        histogram[index] += 1
+                histogram[-2] += wall_seconds
+                histogram[-1] += 1
+            self._write()
+
+    def _write(self):
+        prefix = self.prefix
+        lines = [f"# HELP {prefix}_requests_total OpenRouter requests by final HTTP status.",
+                 f"# TYPE {prefix}_requests_total counter"]
+        for (model, status), count in sorted(self._requests.items()):
+            lines.append(f'{prefix}_requests_total{{model="{_escape(model)}",status="{status}"}} {count}')
+
+        helps = {
+            "request_retries_total": "Retries of throttled or failed OpenRouter requests.",
+            "request_bytes_total": "Request and response body bytes.",
+            "tokens_total": "Prompt and completion tokens reported by OpenRouter.",
+            "cost_total": "Cost in credits reported by OpenRouter.",
+        }
+        for name, help_text in helps.items():
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter"]
+            for (counter_name, labels), value in sorted(self._counters.items()):
+                if counter_name == name:
+                    label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+                    lines.append(f"{prefix}_{name}{{{label_text}}} {_format_value(value)}")
+
+        lines += [f"# HELP {prefix}_request_duration_seconds Wall time of OpenRouter requests including retries.",
+                  f"# TYPE {prefix}_request_duration_seconds histogram"]
+        for model, histogram in sorted(self._durations.items()):
+            model_label = f'model="{_escape(model)}"'
+            for bound, count in zip(DURATION_BUCKETS, histogram):
+                lines.append(f'{prefix}_request_duration_seconds_bucket{{{model_label},le="{bound:g}"}} {count}')
+            lines.append(f'{prefix}_request_duration_seconds_bucket{{{model_label},le="+Inf"}} {histogram[-1]}')
+            lines.append(f"{prefix}_request_duration_seconds_sum{{{model_label}}} {_format_value(histogram[-2])}")
+            lines.append(f"{prefix}_request_duration_seconds_count{{{model_label}}} {histogram[-1]}")
+
+        # The collector may read at any time, so the file is replaced rather than rewritten in place
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+def _format_value(value: float) -> str:
+    # Counters of bytes and tokens grow large, so they are written out in full rather than rounded by %g
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,379 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# Matches the filenames the extractor sends for page ranges, e.g. "PDF1_pages_1-4.pdf"
+PAGE_RANGE_SUFFIX = re.compile(r"_pages_\d+-\d+$")
+TEXT_DOCUMENT_HEADER = re.compile(r"^Text of (.+?):\n")
+
+
+class LatencyModel:
+    """
+    A latency distribution given as "fixed:<s>", "uniform:<low>,<high>" or "lognormal:<median>,<sigma>"
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        """
+        Initializes the LatencyModel.
+        Args: spec (str): The distribution and its parameters in seconds.
+        """
+
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        median, sigma = self.params
+        return rng.lognormvariate(0.0, sigma) * median
+
+
+class MockOpenRouter:
+    """
+    An offline stand-in for OpenRouter's chat completions endpoint that replays the answers stored in the
+    `Output (<model>)` directories, with configurable latency, throttling, server errors, streaming and truncation
+    """
+
+    def __init__(self, outputs_root: str = ".", latency: str = "fixed:0", tokens_per_second: float = 0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 1.0, server_error_rate: float = 0.0,
+                 truncate_rate: float = 0.0, fence: bool = False, seed: Optional[int] = None,
+                 default_model_dir: Optional[str] = None, structured_outputs: bool = True,
+                 prompt_tokens_per_second: float = 0):
+        """
+        Initializes the MockOpenRouter.
+        Args: outputs_root (str): The directory holding the `Output (<model>)` directories.
+        latency (str): The distribution of the time before the first byte of each answer.
+        tokens_per_second (float): The pace at which completion tokens are generated, 0 for no generation delay.
+        rate_limit_rate (float): The share of requests answered with 429 and a Retry-After header.
+        retry_after (float): The Retry-After value sent with a 429, in seconds.
+        server_error_rate (float): The share of requests answered with a 5xx error.
+        truncate_rate (float): The share of answers cut in half and finished with finish_reason "length".
+        fence (bool): Whether to wrap answers in a ```json code fence, as many models do.
+        seed (int | None): The seed of the random choices, for reproducible runs.
+        default_model_dir (str | None): The output directory used for models that have none of their own.
+        structured_outputs (bool): Whether the models list response_format among their supported parameters
+        and answer JSON-schema requests with compact schema-shaped JSON.
+        prompt_tokens_per_second (float): The pace at which the request is read before answering, 0 for no delay,
+        so large documents take longer as they do with a real model.
+        """
+
+        self.outputs_root = Path(outputs_root)
+        self.latency = LatencyModel(latency)
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.server_error_rate = server_error_rate
+        self.truncate_rate = truncate_rate
+        self.fence = fence
+        self.default_model_dir = default_model_dir
+        self.structured_outputs = structured_outputs
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.requests_served = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, float, float, float]:
+        """
+        Draws the random choices for one request under a lock, so a seeded run is reproducible.
+        Returns: tuple: The latency and three uniform numbers deciding throttling, errors and truncation.
+        """
+
+        with self._lock:
+            self.requests_served += 1
+            return (self.latency.sample(self._rng), self._rng.random(), self._rng.random(), self._rng.random())
+
+    def model_dir(self, model_name: str) -> Optional[Path]:
+        model_dir = self.outputs_root / f"Output ({model_name.replace('/', '_')})"
+        if model_dir.is_dir():
+            return model_dir
+        if self.default_model_dir:
+            return self.outputs_root / self.default_model_dir
+        candidates = sorted(self.outputs_root.glob("Output (*)"))
+        return candidates[0] if candidates else None
+
+    def canned_answer(self, model_name: str, filename: str) -> str:
+        """
+        Looks up the stored answer for a document.
+        Args: model_name (str): The requested model.
+        filename (str): The filename sent with the document.
+        Returns: str: The stored JSON text, or an empty array for unknown documents.
+        """
+
+        model_dir = self.model_dir(model_name)
+        stem = PAGE_RANGE_SUFFIX.sub("", Path(filename).stem)
+        if model_dir is not None and (model_dir / f"{stem}.json").is_file():
+            return (model_dir / f"{stem}.json").read_text(encoding="utf-8")
+        return "[]"
+
+    def models(self) -> List[dict]:
+        """
+        Lists the models with stored answers in the shape of OpenRouter's models endpoint.
+        """
+
+        parameters = ["max_tokens", "temperature", "stream"]
+        if self.structured_outputs:
+            parameters += ["response_format", "structured_outputs"]
+        return [{"id": model_dir.name[len("Output ("):-1].replace("_", "/", 1), "supported_parameters": parameters}
+                for model_dir in sorted(self.outputs_root.glob("Output (*)"))]
+
+    def answer_for(self, payload: dict) -> str:
+        """
+        Builds the answer for a chat completions request from the documents it carries.
+        Args: payload (dict): The parsed request body.
+        Returns: str: The model answer.
+        """
+
+        model_name = payload.get("model", "")
+        filenames: List[str] = []
+        partial_answer = None
+        for message in payload.get("messages", []):
+            content = message.get("content")
+            if message.get("role") == "assistant" and isinstance(content, str):
+                # A continuation request replays the answer so far as the assistant's turn
+                partial_answer = content
+            if not isinstance(content, list):
+                continue
+            for part in content:
+                if part.get("type") == "file":
+                    filenames.append(part.get("file", {}).get("filename", ""))
+                elif part.get("type") == "text":
+                    match = TEXT_DOCUMENT_HEADER.match(part.get("text", ""))
+                    if match:
+                        filenames.append(match.group(1))
+
+        if len(filenames) > 1:
+            # Several documents in one request are answered with one array per filename
+            return json.dumps({filename: json.loads(self.canned_answer(model_name, filename))
+                               for filename in filenames}, indent=4, ensure_ascii=False)
+        answer = self.canned_answer(model_name, filenames[0] if filenames else "")
+        response_format = payload.get("response_format") or {}
+        schema = self.structured_outputs and response_format.get("type") == "json_schema"
+        if partial_answer is not None:
+            answer, written = self._remaining_jobs(answer, partial_answer)
+            if not schema:
+                # Picks up right after the last complete object of the answer so far
+                return (", " if written else "") + answer.lstrip()[1:].lstrip()
+        if schema:
+            return self._schema_answer(answer, response_format.get("json_schema", {}).get("schema", {}))
+        return answer
+
+    @staticmethod
+    def _remaining_jobs(answer: str, partial_answer: str) -> Tuple[str, int]:
+        # The answer so far ends after its last complete job object, so closing the array counts them
+        try:
+            written = len(json.loads(partial_answer.rstrip().rstrip(",") + "]"))
+        except json.JSONDecodeError:
+            written = 0
+        return json.dumps(json.loads(answer)[written:], indent=4, ensure_ascii=False), written
+
+    @staticmethod
+    def _schema_answer(answer: str, schema: dict) -> str:
+        # Shapes a stored answer the way a model constrained to the schema would write it: compact, every
+        # value a string, wrapped in the schema's single top-level property
+        def as_text(value) -> str:
+            if isinstance(value, dict):
+                return "; ".join(f"{key}: {as_text(item)}" for key, item in value.items())
+            if isinstance(value, list):
+                return ", ".join(as_text(item) for item in value)
+            return str(value)
+
+        jobs = [{key: as_text(value) for key, value in job.items()} for job in json.loads(answer)]
+        wrapper_key = next(iter(schema.get("properties", {})), None)
+        return json.dumps({wrapper_key: jobs} if wrapper_key else jobs, ensure_ascii=False, separators=(",", ":"))
+
+
+class MockOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockOpenRouterServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        # The extractor pre-warms connections with HEAD requests
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"data": self.server.mock.models()})
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        mock = self.server.mock
+        request_body = self._read_body()
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+            return
+        try:
+            payload = json.loads(request_body)
+        except json.JSONDecodeError as e:
+            self._send_json(400, {"error": {"code": 400, "message": f"Invalid JSON body: {e}"}})
+            return
+
+        latency, throttle_draw, error_draw, truncate_draw = mock.draw()
+        if throttle_draw < mock.rate_limit_rate:
+            self._send_json(429, {"error": {"code": 429, "message": "Rate limit exceeded"}},
+                            {"Retry-After": f"{mock.retry_after:g}"})
+            return
+        time.sleep(latency)
+        if error_draw < mock.server_error_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "Provider unavailable"}})
+            return
+
+        content = mock.answer_for(payload)
+        # Schema-constrained answers never come fenced
+        if mock.fence and not payload.get("response_format"):
+            content = f"```json\n{content}\n```"
+        finish_reason = "stop"
+        if truncate_draw < mock.truncate_rate:
+            content = content[:len(content) // 2]
+            finish_reason = "length"
+
+        usage = {
+            # A rough estimate, good enough for exercising token budgets and metrics
+            "prompt_tokens": len(request_body) // 4,
+            "completion_tokens": max(1, len(content) // 4),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if mock.prompt_tokens_per_second:
+            time.sleep(usage["prompt_tokens"] / mock.prompt_tokens_per_second)
+        if (payload.get("usage") or {}).get("include"):
+            # Priced at one credit per million tokens
+            usage["cost"] = usage["total_tokens"] / 1e6
+        generation_id = f"gen-mock-{mock.requests_served}"
+
+        if payload.get("stream"):
+            self._stream(generation_id, payload.get("model"), content, finish_reason, usage)
+            return
+
+        if mock.tokens_per_second:
+            time.sleep(usage["completion_tokens"] / mock.tokens_per_second)
+        self._send_json(200, {
+            "id": generation_id,
+            "model": payload.get("model"),
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": finish_reason,
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    def _stream(self, generation_id: str, model_name: str, content: str, finish_reason: str, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_chunk(data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def send_event(event: dict):
+            send_chunk(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+
+        send_chunk(b": OPENROUTER PROCESSING\n\n")
+        piece_size = 16
+        for start in range(0, len(content), piece_size):
+            send_event({"id": generation_id, "model": model_name,
+                        "choices": [{"index": 0, "delta": {"content": content[start:start + piece_size]}}]})
+            if self.server.mock.tokens_per_second:
+                time.sleep(piece_size / 4 / self.server.mock.tokens_per_second)
+        send_event({"id": generation_id, "model": model_name,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage})
+        send_chunk(b"data: [DONE]\n\n")
+        send_chunk(b"")
+
+
+class MockOpenRouterServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], mock: MockOpenRouter):
+        super().__init__(address, MockOpenRouterHandler)
+        self.mock = mock
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **options) -> MockOpenRouterServer:
+    """
+    Starts a mock server on a background thread.
+    Args: host (str): The address to listen on.
+    port (int): The port to listen on, 0 for any free port.
+    options: The MockOpenRouter settings.
+    Returns: MockOpenRouterServer: The running server. Its `url` is the chat completions endpoint; call shutdown() to stop it.
+    """
+
+    server = MockOpenRouterServer((host, port), MockOpenRouter(**options))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve canned OpenRouter answers from the Output (<model>) directories.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--outputs-root", default=".", help="Directory holding the 'Output (<model>)' directories")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Time to first byte: fixed:<s>, uniform:<low>,<high> or lognormal:<median>,<sigma>")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Completion generation pace, 0 for instant")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with a 429, in seconds")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of answers cut off with finish_reason 'length'")
+    parser.add_argument("--fence", action="store_true", help="Wrap answers in a ```json code fence")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible runs")
+    parser.add_argument("--default-model-dir", default=None, help="Output directory used for unknown models")
+    parser.add_argument("--no-structured-outputs", action="store_true",
+                        help="Act like a provider without response_format support")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0,
+                        help="Pace at which requests are read before answering, 0 for instant")
+    args = parser.parse_args()
+
+    mock = MockOpenRouter(args.outputs_root, args.latency, args.tokens_per_second, args.rate_limit_rate,
+                          args.retry_after, args.server_error_rate, args.truncate_rate, args.fence, args.seed,
+                          args.default_model_dir, not args.no_structured_outputs, args.prompt_tokens_per_second)
+    server = MockOpenRouterServer((args.host, args.port), mock)
+    print(f"Mock OpenRouter listening on {server.url}")
+    print(f"Run the extractor with OPENROUTER_API_URL={server.url} and any OPENROUTER_API_KEY.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,129 @@
+import io
+from typing import List, Optional, Tuple, Union
+
+# pypdf is only needed for the page-level features, so the extractor keeps working without it
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
+
+def pypdf_available() -> bool:
+    """
+    Returns whether pypdf is installed, which the page-level features depend on.
+    """
+
+    return PdfReader is not None
+
+
+def count_pages(pdf_path: str) -> Optional[int]:
+    """
+    Counts the pages of a PDF.
+    Args: pdf_path (str): The path to the PDF file.
+    Returns: int | None: The number of pages, or None if pypdf is missing or the file cannot be parsed.
+    """
+
+    if not pypdf_available():
+        return None
+    try:
+        return len(PdfReader(pdf_path).pages)
+    except Exception as e:
+        print(f"Warning: could not read pages of '{pdf_path}': {e}")
+        return None
+
+
+def split_pdf_pages(pdf_path: str, pages_per_chunk: int) -> List[Tuple[int, int, bytes]]:
+    """
+    Splits a PDF into consecutive page ranges, each written out as a standalone PDF in memory.
+    Args: pdf_path (str): The path to the PDF file.
+    pages_per_chunk (int): The maximum number of pages in each range.
+    Returns: list: (first page, last page, PDF bytes) tuples in page order, with 1-based page numbers.
+    """
+
+    if not pypdf_available():
+        raise RuntimeError("Splitting PDFs requires pypdf. Install it with 'pip install pypdf'.")
+
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    chunks = []
+    for start in range(0, page_count, pages_per_chunk):
+        end = min(start + pages_per_chunk, page_count)
+        writer = PdfWriter()
+        for page_index in range(start, end):
+            writer.add_page(reader.pages[page_index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        chunks.append((start + 1, end, buffer.getvalue()))
+    return chunks
+
+
+# Pages with fewer extractable characters than this are treated as scanned images
+MIN_TEXT_CHARS_PER_PAGE = 100
+
+
+def _open_reader(pdf_source: Union[str, bytes]) -> "PdfReader":
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return PdfReader(io.BytesIO(pdf_source))
+    return PdfReader(pdf_source)
+
+
+def analyze_text_layer(pdf_source: Union[str, bytes], min_chars: int = MIN_TEXT_CHARS_PER_PAGE) -> Optional[dict]:
+    """
+    Checks whether every page of a PDF carries a usable text layer, stopping at the first page that does not.
+    Args: pdf_source (str | bytes): The path to the PDF file, or its contents.
+    min_chars (int): The number of non-whitespace characters a page needs to count as text.
+    Returns: dict | None: The page count, whether the PDF has a text layer and the first scanned page,
+    or None if pypdf is missing or the file cannot be parsed.
+    """
+
+    if not pypdf_available():
+        return None
+    try:
+        reader = _open_reader(pdf_source)
+        for page_number, page in enumerate(reader.pages, start=1):
+            text = page.extract_text() or ""
+            if sum(not char.isspace() for char in text) < min_chars:
+                return {"pages": len(reader.pages), "has_text_layer": False, "first_scanned_page": page_number}
+        return {"pages": len(reader.pages), "has_text_layer": len(reader.pages) > 0, "first_scanned_page": None}
+    except Exception as e:
+        print(f"Warning: could not inspect the text layer of the PDF: {e}")
+        return None
+
+
+def inspect_layout(pdf_path: str) -> Optional[dict]:
+    """
+    Takes a quick look at a PDF without extracting any text: its page count, and whether its first page is
+    a scanned image, judged by the page carrying no fonts. Cheap enough to run on every file of a batch up front.
+    Args: pdf_path (str): The path to the PDF file.
+    Returns: dict | None: The page count and whether the PDF looks scanned,
+    or None if pypdf is missing or the file cannot be parsed.
+    """
+
+    if not pypdf_available():
+        return None
+    try:
+        reader = PdfReader(pdf_path)
+        if not reader.pages:
+            return {"pages": 0, "scanned": False}
+        resources = reader.pages[0].get("/Resources") or {}
+        if hasattr(resources, "get_object"):
+            resources = resources.get_object()
+        return {"pages": len(reader.pages), "scanned": not resources.get("/Font")}
+    except Exception as e:
+        print(f"Warning: could not inspect '{pdf_path}': {e}")
+        return None
+
+
+def extract_text(pdf_source: Union[str, bytes]) -> str:
+    """
+    Extracts the text layer of a PDF, marking where each page starts.
+    Args: pdf_source (str | bytes): The path to the PDF file, or its contents.
+    Returns: str: The text of all pages.
+    """
+
+    if not pypdf_available():
+        raise RuntimeError("Extracting text requires pypdf. Install it with 'pip install pypdf'.")
+
+    reader = _open_reader(pdf_source)
+    return "\n\n".join(f"--- Page {page_number} ---\n{page.extract_text() or ''}"
+                       for page_number, page in enumerate(reader.pages, start=1))
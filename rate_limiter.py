@@ -0,0 +1,303 @@
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# Status codes that mean "try again later" rather than "this request is wrong"
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+    Args: value (str | None): The header value.
+    Returns: float | None: The number of seconds to wait, or None if the header is missing or malformed.
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills continuously at a per-minute rate
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Initializes the TokenBucket.
+        Args: rate_per_minute (float): The number of tokens added per minute.
+        capacity (float | None): The most tokens the bucket can hold, defaulting to one minute's worth.
+        """
+
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """
+        Takes tokens from the bucket, blocking until enough have accumulated.
+        Args: amount (float): The number of tokens to take, capped at the bucket capacity.
+        """
+
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount: float):
+        """
+        Corrects an earlier estimate once the real usage is known. The bucket may go into debt.
+        Args: amount (float): The number of extra tokens used, negative to give tokens back.
+        """
+
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    An AIMD concurrency limit: it grows by about one slot per round of healthy responses
+    and halves when the provider throttles
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64, latency_tolerance: float = 2.0):
+        """
+        Initializes the AdaptiveConcurrency limit.
+        Args: initial (int): The starting number of requests allowed in flight.
+        minimum (int): The limit never drops below this.
+        maximum (int): The limit never grows beyond this.
+        latency_tolerance (float): Responses slower than this multiple of the baseline latency stop the limit from growing.
+        """
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.latency_tolerance = latency_tolerance
+        self.baseline_latency: Optional[float] = None
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Blocks until a request slot is free under the current limit.
+        """
+
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """
+        Frees a request slot.
+        """
+
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        """
+        Grows the limit additively after a healthy response.
+        Args: latency (float): The wall time of the request in seconds.
+        """
+
+        with self._condition:
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            else:
+                # Slow to rise and quick to fall, so the baseline tracks the fast end of recent latencies
+                weight = 0.05 if latency > self.baseline_latency else 0.3
+                self.baseline_latency += weight * (latency - self.baseline_latency)
+
+            if latency <= self.latency_tolerance * self.baseline_latency:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._condition.notify_all()
+
+    def on_throttle(self, cooldown: float = 1.0):
+        """
+        Halves the limit after the provider throttled a request. Throttles within the cooldown count as one.
+        Args: cooldown (float): The number of seconds during which further throttles do not shrink the limit again.
+        """
+
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease >= cooldown:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+
+
+class ByteBudget:
+    """
+    A global limit on the request payload bytes in flight. Waiting requests are admitted in arrival order,
+    so a large payload is not overtaken forever by small ones that happen to fit
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initializes the ByteBudget.
+        Args: max_bytes (int): The most payload bytes in flight at once. A single larger payload is admitted
+        alone once nothing else is in flight.
+        """
+
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.peak_bytes = 0
+        self.waits = 0
+        self._waiting: deque = deque()
+        self._condition = threading.Condition()
+
+    def acquire(self, amount: int):
+        """
+        Blocks until the payload fits into the budget and it is the payload's turn.
+        Call release() with the same amount when the payload is no longer needed.
+        Args: amount (int): The size of the payload in bytes.
+        """
+
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            waited = False
+            while self._waiting[0] is not ticket or (self.in_flight and self.in_flight + amount > self.max_bytes):
+                waited = True
+                self._condition.wait()
+            self._waiting.popleft()
+            self.in_flight += amount
+            self.peak_bytes = max(self.peak_bytes, self.in_flight)
+            self.waits += waited
+            # The next in line may fit as well
+            self._condition.notify_all()
+
+    def release(self, amount: int):
+        """
+        Returns a payload's bytes to the budget.
+        Args: amount (int): The size of the payload in bytes, as passed to acquire().
+        """
+
+        with self._condition:
+            self.in_flight -= amount
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Returns the budget, the most bytes that were in flight at once and how many requests had to wait.
+        """
+
+        with self._condition:
+            return {"max_bytes": self.max_bytes, "peak_bytes": self.peak_bytes, "waits": self.waits}
+
+
+class RateLimiter:
+    """
+    A limiter shared by every OpenRouter call: request and token budgets per minute, an adaptive
+    concurrency limit, a provider-wide pause for Retry-After, and jittered exponential retry delays
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 initial_concurrency: int = 4, max_concurrency: int = 64, estimated_tokens: int = 4000):
+        """
+        Initializes the RateLimiter.
+        Args: requests_per_minute (float | None): The request budget per minute, or None for no budget.
+        tokens_per_minute (float | None): The token budget per minute, or None for no budget.
+        max_retries (int): How often a throttled or failed request is retried.
+        base_delay (float): The first retry delay in seconds, doubled on every further attempt.
+        max_delay (float): The longest retry delay in seconds.
+        initial_concurrency (int): The number of requests allowed in flight before any feedback arrives.
+        max_concurrency (int): The most requests the adaptive limit allows in flight.
+        estimated_tokens (int): The tokens charged per request up front, corrected once usage is reported.
+        """
+
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.estimated_tokens = estimated_tokens
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Waits out any provider-wide pause and the request, token and concurrency budgets.
+        Call release() when the request completes.
+        """
+
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+
+        if self.request_bucket is not None:
+            self.request_bucket.acquire(1)
+        if self.token_bucket is not None:
+            self.token_bucket.acquire(self.estimated_tokens)
+        self.concurrency.acquire()
+
+    def release(self):
+        """
+        Frees the concurrency slot taken by acquire().
+        """
+
+        self.concurrency.release()
+
+    def on_success(self, latency: float, total_tokens: Optional[int] = None):
+        """
+        Records a successful response.
+        Args: latency (float): The wall time of the request in seconds.
+        total_tokens (int | None): The tokens the provider reported for the request.
+        """
+
+        self.concurrency.on_success(latency)
+        if self.token_bucket is not None and total_tokens is not None:
+            self.token_bucket.adjust(total_tokens - self.estimated_tokens)
+
+    def on_throttle(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Records a throttled or failed response and works out how long to wait before retrying.
+        Args: attempt (int): The zero-based number of the attempt that failed.
+        retry_after (float | None): The delay the provider asked for, if any.
+        Returns: float: The number of seconds to wait before the next attempt.
+        """
+
+        self.concurrency.on_throttle()
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+            # Honor Retry-After for every caller, not only the one that received it
+            with self._lock:
+                self.throttled += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            with self._lock:
+                self.throttled += 1
+        return delay
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+def sha256_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Computes the sha256 hex digest of a file without loading it into memory at once.
+    Args: file_path (str): The path to the file.
+    chunk_size (int): The number of bytes read per step.
+    Returns: str: The hex digest of the file contents.
+    """
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    A content-addressed on-disk cache of extraction results, keyed by the PDF bytes, the model and the prompt
+    """
+
+    def __init__(self, cache_dir: str = ".cache/responses", max_bytes: int = 256 * 1024 * 1024,
+                 max_age: float = 30 * 24 * 3600):
+        """
+        Initializes the ResponseCache.
+        Args: cache_dir (str): The directory the cached responses are stored in.
+        max_bytes (int): The total size the cache may grow to before the least recently used entries are evicted.
+        max_age (float): The number of seconds after which an entry is considered stale.
+        """
+
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, pdf_path: str, model_name: str, prompt_text: str, variant: str = "",
+                 pdf_sha256: Optional[str] = None) -> str:
+        """
+        Builds the cache key for a PDF, model and prompt combination.
+        Args: pdf_path (str): The path to the PDF file.
+        model_name (str): The OpenRouter model used for extraction.
+        prompt_text (str): The extraction prompt sent with the PDF.
+        variant (str): Any other extraction options that change the result.
+        pdf_sha256 (str | None): The digest of the PDF if it is already known, to avoid reading the file again.
+        Returns: str: The hex digest identifying the request.
+        """
+
+        prompt_hash = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+        key_source = f"{pdf_sha256 or sha256_file(pdf_path)}\n{model_name}\n{prompt_hash}"
+        if variant:
+            key_source += f"\n{variant}"
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Looks up a cached extraction result.
+        Args: key (str): The cache key returned by make_key.
+        Returns: str | None: The cached job details, or None on a miss or for a stale entry.
+        """
+
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._count(hit=False)
+            return None
+
+        if time.time() - entry.get("created", 0) > self.max_age:
+            self._remove(entry_path)
+            self._count(hit=False)
+            return None
+
+        # Touch the entry so size-based eviction drops the least recently used results first
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return entry.get("content")
+
+    def put(self, key: str, content: str, model_name: str = None):
+        """
+        Stores an extraction result and evicts old entries if the cache grew past its size limit.
+        Args: key (str): The cache key returned by make_key.
+        content (str): The job details to cache.
+        model_name (str): The model that produced the result, kept for reference.
+        """
+
+        entry = {"created": time.time(), "model": model_name, "content": content}
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes stale entries, then the least recently used ones until the cache fits in max_bytes.
+        """
+
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry_path in self.cache_dir.glob("*.json"):
+                try:
+                    stat = entry_path.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(entry_path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, entry_path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                self._remove(entry_path)
+                total_bytes -= size
+
+    def _remove(self, entry_path: Path):
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters of the cache.
+        Returns: dict: The number of hits and misses and the resulting hit rate.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
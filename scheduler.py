@@ -0,0 +1,113 @@
+import os
+import math
+import heapq
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pdf_tools import inspect_layout
+
+SCHEDULING_POLICIES = ("fifo", "sjf", "fair")
+
+# The cost model, in rough seconds of extraction: every request pays a fixed overhead, uploads grow with the file,
+# answers with the number of pages, and scanned pages go through OCR first
+REQUEST_COST = 2.0
+COST_PER_MB = 1.0
+COST_PER_PAGE = 1.0
+SCANNED_COST_FACTOR = 2.0
+
+
+def estimate_cost(pdf_paths: Iterable[str]) -> float:
+    """
+    Estimates how long extracting one request's PDFs takes, from their size, page count and whether they are scanned.
+    Only the relative order matters to the scheduler, so the estimate stays cheap rather than precise.
+    Args: pdf_paths (Iterable[str]): The PDFs sent in the request.
+    Returns: float: The estimated cost in rough seconds.
+    """
+
+    cost = REQUEST_COST
+    for pdf_path in pdf_paths:
+        try:
+            size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+        except OSError:
+            # Missing files fail straight away
+            continue
+        layout = inspect_layout(pdf_path)
+        # Without pypdf the size alone has to do, at roughly the size of a scanned page per page
+        pages = layout["pages"] if layout is not None else max(1, round(size_mb / 0.3))
+        document_cost = size_mb * COST_PER_MB + pages * COST_PER_PAGE
+        if layout is not None and layout["scanned"]:
+            document_cost *= SCANNED_COST_FACTOR
+        cost += document_cost
+    return cost
+
+
+class BatchScheduler:
+    """
+    Decides which request of a batch is sent next, by arrival ("fifo"), estimated cost ("sjf"),
+    or in weighted-fair turns between size classes ("fair")
+    """
+
+    def __init__(self, policy: str = "fifo", aging: float = 0.5):
+        """
+        Initializes the BatchScheduler.
+        Args: policy (str): "fifo" sends requests in arrival order. "sjf" sends the cheapest request first,
+        lowering the mean completion time of the batch, while aging keeps a large request from starving
+        behind cheaper ones that keep being pushed after it.
+        "fair" gives every size class, a doubling of the estimated cost, an equal share of the estimated work,
+        so small requests finish early without large ones waiting for all of them.
+        aging (float): With "sjf", how much a request's estimated cost is lowered per second it waits.
+        """
+
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}', expected one of {', '.join(SCHEDULING_POLICIES)}.")
+        self.policy = policy
+        self.aging = aging
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._sequence = 0
+        self._started = time.monotonic()
+        # Self-clocked fair queuing: the virtual time is the finish tag of the request sent last
+        self._virtual_time = 0.0
+        self._class_finish: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def push(self, item: Any, cost: Optional[float] = None):
+        """
+        Adds a request to the schedule.
+        Args: item (Any): The request, e.g. a group of PDF paths.
+        cost (float | None): Its estimated cost, see estimate_cost. Only "fifo" does without one.
+        """
+
+        if cost is None and self.policy != "fifo":
+            raise ValueError(f"The '{self.policy}' policy needs the estimated cost of every request.")
+        with self._lock:
+            if self.policy == "sjf":
+                # Lowering the cost by aging * waited is the same for every request at any moment, so the order
+                # only depends on cost + aging * arrival time and the heap never needs reordering
+                key = cost + self.aging * (time.monotonic() - self._started)
+            elif self.policy == "fair":
+                size_class = math.floor(math.log2(max(cost, 1.0)))
+                key = max(self._virtual_time, self._class_finish.get(size_class, 0.0)) + cost
+                self._class_finish[size_class] = key
+            else:
+                key = float(self._sequence)
+            heapq.heappush(self._heap, (key, self._sequence, item))
+            self._sequence += 1
+
+    def pop(self) -> Optional[Any]:
+        """
+        Takes the request to send next.
+        Returns: Any | None: The request, or None if the schedule is empty.
+        """
+
+        with self._lock:
+            if not self._heap:
+                return None
+            key, _, item = heapq.heappop(self._heap)
+            if self.policy == "fair":
+                self._virtual_time = key
+            return item
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
@@ -1,67 +1,496 @@
 import os
 import json
 import base64
+import hashlib
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from typing import Union, Optional 
+from functools import partial
+from typing import Union, Optional, Callable, Dict, Iterable, List, TextIO, Tuple
 import sys
+import time
+import glob
+import asyncio
+import signal
+import socket
+import argparse
+import threading
+import contextvars
+import socketserver
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from response_cache import ResponseCache, sha256_file
+from job_queue import JobQueue
+from client import default_socket_path
+from watcher import DirectoryWatcher, ProcessedFiles
+from rate_limiter import ByteBudget, RateLimiter, RETRYABLE_STATUS_CODES, parse_retry_after
+from pdf_tools import analyze_text_layer, count_pages, extract_text, split_pdf_pages
+from metrics import JsonlMetricsWriter, PrometheusTextfileWriter, fan_out
+from cassette import CASSETTE_MODES, Cassette, CassetteAdapter
+from scheduler import SCHEDULING_POLICIES, BatchScheduler, estimate_cost
+from job_schema import IncrementalJobArrayParser, JobSchema, loads, parse_job_fragment, slice_json
 load_dotenv()
 
+# The detailed prompt for extracting job information
+EXTRACTION_PROMPT = "This PDF contains details about job openings. Extract the following information in a structured JSON format. If the document lists multiple job openings, treat each one separately. Do NOT combine or mix information across different jobs. Display each job as a separate object in a list, in the order they appear in the PDF.\n\nDo NOT separate job postings based on caste, category, or reservation type (e.g., SC/ST/OBC/EWS/UR). If a job includes reservation breakdowns, include those details under 'Reservation details' within the same job object.\n\nFor each job, extract:\n- Company name\n- Job title\n- Number of openings (if mentioned)\n- Reservation details (if applicable)\n- Location\n- Qualifications required\n- Skills required\n- Age limit (if mentioned)\n- Salary or compensation details\n- Application deadline\n- Mode of application (online/offline, email, etc.)\n- Contact details (if any)\n\nIf any section is missing, use \"not mentioned\".\n\nReturn only a clean JSON array of job objects. Each object must represent a single job posting. Do not include any additional explanation, summary, or text outside of the JSON output."
+
+# The fields the prompt asks for in every job object
+JOB_FIELDS = (
+    "Company name",
+    "Job title",
+    "Number of openings",
+    "Reservation details",
+    "Location",
+    "Qualifications required",
+    "Skills required",
+    "Age limit",
+    "Salary or compensation details",
+    "Application deadline",
+    "Mode of application",
+    "Contact details",
+)
+JOB_SCHEMA = JobSchema(JOB_FIELDS)
+
+# Appended to the prompt when the answer is constrained by a JSON schema, which cannot be a bare array
+STRUCTURED_OUTPUT_INSTRUCTIONS = "Return the JSON array as the value of \"jobs\" in a JSON object, with every value written as text."
+
+# Sent after the answer so far when the model ran out of output tokens part way through the array
+CONTINUATION_PROMPT = "Your answer was cut off by the output length limit. Continue it: write only the job objects that are still missing, in the same format, and do not repeat the jobs already written."
+
+# Appended to the prompt when several small PDFs share one request
+PACKED_EXTRACTION_INSTRUCTIONS = "This request contains several PDF files. Each file is introduced by a line of the form '=== FILE: <filename> ==='. Apply the instructions above to every file on its own and never mix jobs from different files. Instead of a single array, return only one JSON object whose keys are exactly the filenames and whose values are the JSON arrays of job objects for each file."
+
+# OpenRouter's file-parser engines, plus "text" for sending the locally extracted text layer instead of the file
+PDF_ENGINES = ("pdf-text", "mistral-ocr", "native")
+LOCAL_TEXT_ENGINE = "text"
+
+# Stand in for the per-document parts while the rest of the request is serialized once per extractor
+_FILENAME_PLACEHOLDER = "__PDF_FILENAME__"
+_DOCUMENT_PLACEHOLDER = "__PDF_DOCUMENT_DATA__"
+_PARTIAL_ANSWER_PLACEHOLDER = "__PARTIAL_ANSWER__"
+
+# How often queue workers that found nothing pending check back on the jobs still in flight
+QUEUE_POLL_SECONDS = 1.0
+
+
+_metadata_lock = threading.Lock()
+
+
+def _record_timing(metadata: Optional[dict], stage: str, seconds: float):
+    """
+    Adds the time spent in a processing stage to the document's metadata.
+    Args: metadata (dict | None): The per-document metadata, or None if nobody is interested.
+    stage (str): The name of the stage, e.g. "network".
+    seconds (float): The time spent.
+    """
+
+    if metadata is None:
+        return
+    # Page ranges of one document run in parallel and add to the same timings
+    with _metadata_lock:
+        timings = metadata.setdefault("timings", {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def _record_body_timings(metadata: Optional[dict], request_body, request_seconds: float):
+    """
+    Splits the time spent sending a request into reading, encoding and network waiting.
+    Args: metadata (dict | None): The per-document metadata.
+    request_body (StreamingPdfBody | bytes): The body that was sent.
+    request_seconds (float): The wall time from sending the request to receiving the whole answer.
+    """
+
+    read_seconds = getattr(request_body, "read_seconds", 0.0)
+    encode_seconds = getattr(request_body, "encode_seconds", 0.0)
+    _record_timing(metadata, "read", read_seconds)
+    _record_timing(metadata, "encode", encode_seconds)
+    _record_timing(metadata, "network", max(0.0, request_seconds - read_seconds - encode_seconds))
+
+
+def _record_usage(metadata: Optional[dict], request_record: dict):
+    """
+    Adds the generation id and the token usage and cost of a request to the document's metadata.
+    Args: metadata (dict | None): The per-document metadata, or None if nobody is interested.
+    request_record (dict): The metrics record of the request.
+    """
+
+    if metadata is None:
+        return
+    with _metadata_lock:
+        if request_record.get("generation_id"):
+            metadata.setdefault("generation_ids", []).append(request_record["generation_id"])
+        usage = metadata.setdefault("usage", {})
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens", "cost"):
+            if request_record.get(field) is not None:
+                usage[field] = usage.get(field, 0) + request_record[field]
+
+
+def _in_context(function: Callable) -> Callable:
+    """
+    Binds a function to the caller's context variables, which executor threads do not inherit,
+    so output printed on behalf of a daemon request still reaches its client.
+    Args: function (Callable): The function to run in another thread.
+    Returns: Callable: The bound function, which may be called several times and concurrently.
+    """
+
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so every call gets a copy of its own
+        return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+def _json_string_content(text: str) -> bytes:
+    """
+    Escapes text for splicing between the quotes of a serialized JSON string.
+    """
+
+    return json.dumps(text)[1:-1].encode("ascii")
+
+
+class PdfDocument:
+    """
+    A PDF that is read and base64-encoded once, so requests to several models can share one payload
+    """
+
+    def __init__(self, pdf_path: str):
+        """
+        Initializes the PdfDocument.
+        Args: pdf_path (str): The path to the PDF file.
+        """
+
+        with open(pdf_path, "rb") as pdf_file:
+            pdf_data = pdf_file.read()
+        self.path = pdf_path
+        self.size = len(pdf_data)
+        self.sha256 = hashlib.sha256(pdf_data).hexdigest()
+        self.base64_data = base64.b64encode(pdf_data)
+
+
+class ConcatenatedBody:
+    """
+    A request body made of several streamed parts sent back to back
+    """
+
+    def __init__(self, parts: List["StreamingPdfBody"]):
+        self.parts = parts
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            yield from part
+
+    @property
+    def read_seconds(self) -> float:
+        return sum(part.read_seconds for part in self.parts)
+
+    @property
+    def encode_seconds(self) -> float:
+        return sum(part.encode_seconds for part in self.parts)
+
+
+class StreamingPdfBody:
+    """
+    A request body that base64-encodes a PDF block by block while it is uploaded,
+    so a request never holds more than one block of the encoded file in memory
+    """
+
+    # A multiple of 3, so the encoded blocks concatenate without inner padding
+    BLOCK_SIZE = 3 * 64 * 1024
+
+    def __init__(self, prefix: bytes, pdf_source: Union[str, bytes, PdfDocument], suffix: bytes):
+        """
+        Initializes the StreamingPdfBody.
+        Args: prefix (bytes): The serialized JSON preceding the base64 data.
+        pdf_source (str | bytes | PdfDocument): The path to the PDF file to encode, the PDF bytes themselves,
+        or an already encoded PdfDocument.
+        suffix (bytes): The serialized JSON following the base64 data.
+        """
+
+        self.prefix = prefix
+        self.pdf_source = pdf_source
+        self.suffix = suffix
+        # Reading and encoding happen while uploading, so the body keeps track of the time they take
+        self.read_seconds = 0.0
+        self.encode_seconds = 0.0
+        if isinstance(pdf_source, PdfDocument):
+            self.pdf_size = pdf_source.size
+        elif isinstance(pdf_source, (bytes, bytearray)):
+            self.pdf_size = len(pdf_source)
+        else:
+            self.pdf_size = os.path.getsize(pdf_source)
+
+    def __len__(self) -> int:
+        # Knowing the length up front lets requests send a Content-Length instead of a chunked upload
+        return len(self.prefix) + 4 * ((self.pdf_size + 2) // 3) + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        if isinstance(self.pdf_source, PdfDocument):
+            encoded_view = memoryview(self.pdf_source.base64_data)
+            encoded_block_size = 4 * self.BLOCK_SIZE // 3
+            for start in range(0, len(encoded_view), encoded_block_size):
+                yield encoded_view[start:start + encoded_block_size]
+        elif isinstance(self.pdf_source, (bytes, bytearray)):
+            pdf_view = memoryview(self.pdf_source)
+            for start in range(0, self.pdf_size, self.BLOCK_SIZE):
+                started = time.perf_counter()
+                block = base64.b64encode(pdf_view[start:start + self.BLOCK_SIZE])
+                self.encode_seconds += time.perf_counter() - started
+                yield block
+        else:
+            with open(self.pdf_source, "rb") as pdf_file:
+                while True:
+                    started = time.perf_counter()
+                    block = pdf_file.read(self.BLOCK_SIZE)
+                    read_done = time.perf_counter()
+                    self.read_seconds += read_done - started
+                    if not block:
+                        break
+                    encoded_block = base64.b64encode(block)
+                    self.encode_seconds += time.perf_counter() - read_done
+                    yield encoded_block
+        yield self.suffix
+
+
+class RequestCancelled(requests.exceptions.RequestException):
+    """
+    Raised when a hedged request is abandoned because the other model answered first
+    """
+
+
 class JobPostingExtractor:
     """
     A class to extract job posting details from a scanned PDF using the OpenRouter API
     """
 
-    def __init__(self,api_key: str = None, model_name="deepseek/deepseek-chat"):
+    def __init__(self,api_key: str = None, model_name="deepseek/deepseek-chat", pool_size: int = 10,
+                 cache: Optional[ResponseCache] = None, refresh_cache: bool = False,
+                 pages_per_chunk: Optional[int] = None, pdf_engine: Optional[str] = None,
+                 text_layer_engine: str = "pdf-text", scanned_engine: str = "mistral-ocr",
+                 rate_limiter: Optional[RateLimiter] = None, stream: bool = False, jsonl_dir: Optional[str] = None,
+                 pack_max_bytes: Optional[int] = None, pack_max_pages: Optional[int] = None, pack_max_files: int = 8,
+                 on_request: Optional[Callable[[dict], None]] = None, cassette: Optional[Cassette] = None,
+                 hedge_model: Optional[str] = None, hedge_percentile: float = 95.0, hedge_delay: float = 30.0,
+                 cascade_model: Optional[str] = None, cascade_threshold: float = 0.6,
+                 invalid_answer_retries: int = 1, structured_output: bool = False, max_continuations: int = 3,
+                 schedule: str = "fifo", byte_budget: Optional[ByteBudget] = None,
+                 request_timeout: Tuple[float, float] = (10.0, 300.0)):
         """
         Initializes the JobPostingExtractor.
         Args: api_key_env_var (str): The name of the environment variable where the OpenRouter API key is stored.
         model_name (str): The name of the OpenRouter model to use for extraction.
+        pool_size (int): The maximum number of keep-alive connections held open to OpenRouter.
+        cache (ResponseCache | None): An optional cache of previous extraction results.
+        refresh_cache (bool): Whether to ignore cached results and overwrite them with fresh ones.
+        pages_per_chunk (int | None): If set, longer PDFs are split into ranges of this many pages that are extracted concurrently.
+        pdf_engine (str | None): The file-parser engine to request, "auto" to pick one per PDF, or None for OpenRouter's default.
+        text_layer_engine (str): The engine "auto" picks for PDFs with a usable text layer, "pdf-text" or "text".
+        scanned_engine (str): The engine "auto" picks for scanned PDFs, "mistral-ocr" or "native".
+        rate_limiter (RateLimiter | None): The limiter and retry policy for OpenRouter calls, shareable between extractors.
+        stream (bool): Whether to stream completions and hand out each job as soon as it is complete.
+        jsonl_dir (str | None): If set, every job is also appended to `<jsonl_dir>/<pdf stem>.jsonl` as it arrives.
+        pack_max_bytes (int | None): If set, extract_many packs PDFs into shared requests of up to this many bytes in total.
+        Packing is turned off when the options below include one a packed request cannot honour: pdf_engine "auto"
+        or "text", stream, jsonl_dir, hedge_model, cascade_model or structured_output.
+        pack_max_pages (int | None): The page budget of a packed request, if any.
+        pack_max_files (int): The most PDFs packed into one request.
+        on_request (Callable | None): Receives a metrics record after every OpenRouter call, see metrics.REQUEST_METRIC_FIELDS.
+        cassette (Cassette | None): If set, OpenRouter responses are recorded to or replayed from it.
+        hedge_model (str | None): If set, a PDF the model has not answered within the hedge delay is also sent to this model,
+        and the first valid job array wins.
+        hedge_percentile (float): The percentile of recent response times used as the hedge delay.
+        hedge_delay (float): The hedge delay in seconds until enough response times are known.
+        cascade_model (str | None): If set, a PDF whose answer scores below cascade_threshold is extracted again with this
+        stronger model, see score_job_details.
+        cascade_threshold (float): The lowest score, between 0 and 1, accepted without escalating.
+        invalid_answer_retries (int): How often to ask again when an answer is not a job array and cannot be repaired.
+        structured_output (bool): Whether to constrain answers with a JSON-schema response_format for models that
+        support it, falling back to the prompt alone for the others.
+        max_continuations (int): How often an answer cut off by the output length limit is continued from its last
+        complete job, rather than requested again from the start.
+        schedule (str): The order extract_many sends requests in: "fifo", "sjf" for the cheapest first,
+        or "fair" for weighted-fair turns between size classes, see scheduler.BatchScheduler.
+        byte_budget (ByteBudget | None): If set, the batch runners only start a PDF once its encoded size fits into
+        this global limit on the payload bytes in flight. Shareable between extractors.
+        request_timeout (tuple): The (connect, read) timeouts of an OpenRouter call in seconds. The read timeout bounds
+        every wait for the next bytes of the answer, including the first; a call that times out is retried.
         """
 
         self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.url = "https://openrouter.ai/api/v1/chat/completions"
+        # Can point at a local stand-in such as mock_openrouter.py for offline runs
+        self.url = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
         self.model_name = model_name
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        self.pages_per_chunk = pages_per_chunk
+        self.pdf_engine = pdf_engine
+        self.text_layer_engine = text_layer_engine
+        self.scanned_engine = scanned_engine
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.stream = stream
+        self.jsonl_dir = jsonl_dir
+        # A packed request carries several files and answers with one object keyed by filename, so per-document
+        # engine choice, streaming, hedging, escalation and the schema-constrained array do not apply to it
+        packing_conflicts = [option for option, enabled in (
+            (f"pdf_engine={pdf_engine}", pdf_engine in ("auto", LOCAL_TEXT_ENGINE)),
+            ("stream", stream), ("jsonl_dir", jsonl_dir), ("hedge_model", hedge_model),
+            ("cascade_model", cascade_model), ("structured_output", structured_output)) if enabled]
+        if pack_max_bytes and packing_conflicts:
+            print(f"Warning: packing is turned off, packed requests do not support {', '.join(packing_conflicts)}.")
+            pack_max_bytes = None
+        self.pack_max_bytes = pack_max_bytes
+        self.pack_max_pages = pack_max_pages
+        self.pack_max_files = pack_max_files
+        self.on_request = on_request
+        self.cassette = cassette
+        self.hedge_model = hedge_model
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.cascade_model = cascade_model
+        self.cascade_threshold = cascade_threshold
+        self.invalid_answer_retries = invalid_answer_retries
+        self.structured_output = structured_output
+        self.max_continuations = max_continuations
+        if schedule not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{schedule}', expected one of {', '.join(SCHEDULING_POLICIES)}.")
+        self.schedule = schedule
+        self.byte_budget = byte_budget
+        self.request_timeout = request_timeout
+        self._structured_models: Optional[Dict[str, bool]] = None
+        self._structured_models_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=256)
+        self._latency_lock = threading.Lock()
+        # Hedged requests run here, apart from the callers' threads that wait for them, sized by _size_hedge_executor
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_workers = 0
+        self._hedge_lock = threading.Lock()
+        self._request_templates: Dict[tuple, Tuple[bytes, bytes, bytes]] = {}
 
-        if not self.api_key:
+        # Replaying recorded responses never reaches OpenRouter, so it needs no key
+        if not self.api_key and not (cassette is not None and cassette.mode == "replay"):
             raise ValueError(
                 f"Error: OpenRouter API key not found. "
             )
 
-    def _encode_pdf_to_base64(self, pdf_path: str)-> Optional[str]:
+        # One pooled keep-alive session per extractor, so every call reuses an open socket
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+        self._mount_connection_pool(pool_size)
+
+    def _mount_connection_pool(self, pool_size: int):
         """
-        Encodes a PDF file to a base64 string.
-        Args: pdf_path (str): The path to the PDF file.
-        Returns: str | None: The base64 encoded string of the PDF, or None if the file is not found.
+        Mounts a connection pool of the given size on the session.
+        Args: pool_size (int): The maximum number of connections kept open per host.
         """
 
-        try:
-            with open(pdf_path, "rb") as pdf_file:
-                return base64.b64encode(pdf_file.read()).decode('utf-8')
-        except FileNotFoundError:
-            print(f"Error: PDF file not found at '{pdf_path}'. Please ensure the file exists.")
-            return None
+        self.pool_size = pool_size
+        for old_adapter in self.session.adapters.values():
+            old_adapter.close()
+        if self.cassette is not None:
+            adapter = CassetteAdapter(self.cassette, pool_connections=1, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
-    def extract_job_details(self, pdf_path: str) -> Optional[dict]:
+    def warm_up(self, connections: int = 1):
         """
-        Extracts job details from a PDF using the OpenRouter API.
-        Args:  pdf_path (str): The path to the PDF file containing job postings.
-        Returns: dict | None: A dictionary containing the extracted job information or None if the extraction fails.
+        Opens connections to OpenRouter ahead of time so the first extractions skip the TCP and TLS handshakes.
+        Args: connections (int): The number of connections to open, capped at the pool size.
         """
 
-        base64_pdf = self._encode_pdf_to_base64(pdf_path)
-        if base64_pdf is None:
-            return None
-        data_url = f"data:application/pdf;base64,{base64_pdf}"
+        connections = max(1, min(connections, self.pool_size))
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        def touch(_):
+            try:
+                # Any response will do, the point is to leave an established socket in the pool
+                self.session.head(self.url, timeout=10).close()
+            except requests.exceptions.RequestException as e:
+                print(f"Warning: could not pre-warm connection to {self.url}: {e}")
 
-        # The detailed prompt for extracting job information
-        prompt_text= "This PDF contains details about job openings. Extract the following information in a structured JSON format. If the document lists multiple job openings, treat each one separately. Do NOT combine or mix information across different jobs. Display each job as a separate object in a list, in the order they appear in the PDF.\n\nDo NOT separate job postings based on caste, category, or reservation type (e.g., SC/ST/OBC/EWS/UR). If a job includes reservation breakdowns, include those details under 'Reservation details' within the same job object.\n\nFor each job, extract:\n- Company name\n- Job title\n- Number of openings (if mentioned)\n- Reservation details (if applicable)\n- Location\n- Qualifications required\n- Skills required\n- Age limit (if mentioned)\n- Salary or compensation details\n- Application deadline\n- Mode of application (online/offline, email, etc.)\n- Contact details (if any)\n\nIf any section is missing, use \"not mentioned\".\n\nReturn only a clean JSON array of job objects. Each object must represent a single job posting. Do not include any additional explanation, summary, or text outside of the JSON output."
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(_in_context(touch), range(connections)))
+
+    def close(self):
+        """
+        Closes the pooled connections held by the extractor.
+        """
+
+        self.session.close()
+        if self._hedge_executor is not None:
+            # Abandoned hedges finish in the background, there is no point in waiting for them
+            self._hedge_executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _select_pdf_engine(self, pdf_path: str, metadata: dict) -> Optional[str]:
+        """
+        Picks the PDF engine for a document, checking its text layer locally when the engine is "auto".
+        Args: pdf_path (str): The path to the PDF file.
+        metadata (dict): The per-document metadata the choice is recorded in.
+        Returns: str | None: The engine to use, or None to leave the choice to OpenRouter.
+        """
+
+        if self.pdf_engine != "auto":
+            metadata["pdf_engine"] = self.pdf_engine or "default"
+            return self.pdf_engine
+
+        text_layer = analyze_text_layer(pdf_path)
+        if text_layer is None:
+            pdf_engine = None
+        elif text_layer["has_text_layer"]:
+            pdf_engine = self.text_layer_engine
+        else:
+            pdf_engine = self.scanned_engine
+        metadata["pdf_engine"] = pdf_engine or "default"
+        metadata["text_layer"] = text_layer
+        return pdf_engine
+
+    def _request_template(self, pdf_engine: Optional[str] = None, stream: bool = False,
+                          model_name: Optional[str] = None, continuation: bool = False) -> Tuple[bytes, bytes, bytes]:
+        """
+        Returns the request serialized once per model and options, split around the filename and the document.
+        Args: pdf_engine (str | None): The file-parser engine to request, or "text" to send the extracted text.
+        stream (bool): Whether to ask for the completion as a stream of server-sent events.
+        model_name (str | None): The model to ask, defaulting to the extractor's model.
+        continuation (bool): Whether the request continues a cut off answer, which then follows the document
+        as the assistant's turn, marked by _PARTIAL_ANSWER_PLACEHOLDER in the last part.
+        Returns: tuple: The serialized bytes before the filename, between the filename and the document, and after the document.
+        """
+
+        model_name = model_name or self.model_name
+        structured = self._uses_structured_output(model_name)
+        template_key = (model_name, pdf_engine, stream, structured, continuation)
+        template = self._request_templates.get(template_key)
+        if template is not None:
+            return template
+
+        if pdf_engine == LOCAL_TEXT_ENGINE:
+            document_part = {
+                "type": "text",
+                "text": f"Text of {_FILENAME_PLACEHOLDER}:\n\n{_DOCUMENT_PLACEHOLDER}"
+            }
+        else:
+            document_part = {
+                "type": "file",
+                "file": {
+                    "filename": _FILENAME_PLACEHOLDER, # Use actual filename
+                    "file_data": f"data:application/pdf;base64,{_DOCUMENT_PLACEHOLDER}"
+                }
+            }
 
         messages = [
             {
@@ -69,88 +498,1969 @@ class JobPostingExtractor:
                 "content": [
                     {
                         "type": "text",
-                        "text": prompt_text
-                    },
-                    {
-                        "type": "file",
-                        "file": {
-                            "filename": Path(pdf_path).name, # Use actual filename
-                            "file_data": data_url
-                        }
+                        "text": f"{EXTRACTION_PROMPT}\n\n{STRUCTURED_OUTPUT_INSTRUCTIONS}" if structured else EXTRACTION_PROMPT
                     },
+                    document_part,
                 ]
             }
         ]
+        if continuation:
+            # The API keeps no conversation state, so the document is sent again along with the answer so far
+            messages += [
+                {"role": "assistant", "content": _PARTIAL_ANSWER_PLACEHOLDER},
+                {"role": "user", "content": CONTINUATION_PROMPT},
+            ]
 
         payload = {
-            "model": self.model_name,
-            "messages": messages
+            "model": model_name,
+            "messages": messages,
+            # Asks OpenRouter to report the cost along with the token counts
+            "usage": {"include": True}
+        }
+        if pdf_engine and pdf_engine != LOCAL_TEXT_ENGINE:
+            payload["plugins"] = [{"id": "file-parser", "pdf": {"engine": pdf_engine}}]
+        if stream:
+            payload["stream"] = True
+        if structured:
+            payload["response_format"] = JOB_SCHEMA.response_format()
+
+        head, rest = json.dumps(payload).encode("utf-8").split(_FILENAME_PLACEHOLDER.encode("ascii"))
+        middle, tail = rest.split(_DOCUMENT_PLACEHOLDER.encode("ascii"))
+        template = self._request_templates[template_key] = (head, middle, tail)
+        return template
+
+    def _uses_structured_output(self, model_name: Optional[str] = None) -> bool:
+        """
+        Decides whether requests to a model carry the JSON-schema response_format. Support is looked up once
+        in OpenRouter's model list; models that do not list response_format get the prompt alone.
+        Args: model_name (str | None): The model, defaulting to the extractor's model.
+        Returns: bool: Whether to send the response_format.
+        """
+
+        if not self.structured_output:
+            return False
+        with self._structured_models_lock:
+            if self._structured_models is None:
+                self._structured_models = self._fetch_structured_models()
+        return self._structured_models.get(model_name or self.model_name, False)
+
+    def _fetch_structured_models(self) -> Dict[str, bool]:
+        """
+        Asks OpenRouter which models support a JSON-schema response_format.
+        Returns: dict: Whether each listed model supports it, or nothing if the list cannot be fetched.
+        """
+
+        models_url = self.url.rsplit("/chat/completions", 1)[0] + "/models"
+        try:
+            response = self.session.get(models_url, timeout=30)
+            response.raise_for_status()
+            return {
+                model["id"]: bool({"response_format", "structured_outputs"} & set(model.get("supported_parameters") or ()))
+                for model in response.json()["data"]
+            }
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: could not look up which models support structured output, using the prompt alone: {e}")
+            return {}
+
+    def _build_request_body(self, pdf_path: str, pdf_source: Optional[Union[bytes, PdfDocument]] = None,
+                            filename: Optional[str] = None,
+                            pdf_engine: Optional[str] = None,
+                            stream: bool = False,
+                            model_name: Optional[str] = None,
+                            partial_answer: Optional[str] = None) -> Optional[Union["StreamingPdfBody", bytes]]:
+        """
+        Builds the streamed JSON request body for a PDF by splicing it into the precompiled request template.
+        Args: pdf_path (str): The path to the PDF file.
+        pdf_source (bytes | PdfDocument | None): The PDF contents to send instead of reading pdf_path,
+        e.g. a range of its pages or a document shared between models.
+        filename (str | None): The filename reported to the model, defaulting to the name of pdf_path.
+        pdf_engine (str | None): The file-parser engine to request, or "text" to send the extracted text instead of the file.
+        stream (bool): Whether to ask for the completion as a stream of server-sent events.
+        model_name (str | None): The model to ask, defaulting to the extractor's model.
+        partial_answer (str | None): If set, the request continues this cut off answer.
+        Returns: StreamingPdfBody | bytes | None: The request body, or None if the file is not found.
+        """
+
+        if pdf_source is None and not os.path.isfile(pdf_path):
+            print(f"Error: PDF file not found at '{pdf_path}'. Please ensure the file exists.")
+            return None
+
+        head, middle, tail = self._request_template(pdf_engine, stream, model_name, partial_answer is not None)
+        if partial_answer is not None:
+            tail = tail.replace(_PARTIAL_ANSWER_PLACEHOLDER.encode("ascii"), _json_string_content(partial_answer))
+        prefix = head + _json_string_content(filename or Path(pdf_path).name) + middle
+
+        if pdf_engine == LOCAL_TEXT_ENGINE:
+            document_text = extract_text(pdf_source if isinstance(pdf_source, bytes) else pdf_path)
+            return prefix + _json_string_content(document_text) + tail
+
+        # The PDF itself is never serialized, it is base64-encoded straight into the body while uploading
+        return StreamingPdfBody(prefix, pdf_path if pdf_source is None else pdf_source, tail)
+
+    def extract_job_details(self, pdf_path: str, metadata: Optional[dict] = None,
+                            document: Optional[PdfDocument] = None,
+                            on_job: Optional[Callable[[dict], None]] = None) -> Optional[dict]:
+        """
+        Extracts job details from a PDF, serving repeated requests from the response cache when one is configured.
+        Args:  pdf_path (str): The path to the PDF file containing job postings.
+        metadata (dict | None): A dictionary that receives details about how the PDF was processed.
+        document (PdfDocument | None): The PDF already read and encoded, to avoid doing it again for this call.
+        on_job (Callable | None): Called with each job object, as soon as it is complete when streaming.
+        Returns: dict | None: A dictionary containing the extracted job information or None if the extraction fails.
+        """
+
+        if metadata is None:
+            metadata = {}
+        metadata["model"] = self.model_name
+        started = time.perf_counter()
+        try:
+            return self._extract_job_details(pdf_path, metadata, document, on_job)
+        finally:
+            _record_timing(metadata, "total", time.perf_counter() - started)
+
+    def _extract_job_details(self, pdf_path: str, metadata: dict, document: Optional[PdfDocument] = None,
+                             on_job: Optional[Callable[[dict], None]] = None) -> Optional[dict]:
+        """
+        Extracts job details from a PDF and hands out the jobs to the callback and the JSONL sink, if any.
+        """
+
+        if on_job is None and self.jsonl_dir is None:
+            return self._extract_with_cache(pdf_path, metadata, document)
+
+        sink: Optional[TextIO] = None
+        if self.jsonl_dir is not None:
+            os.makedirs(self.jsonl_dir, exist_ok=True)
+            sink = open(Path(self.jsonl_dir) / f"{Path(pdf_path).stem}.jsonl", "w", encoding="utf-8")
+        emitted_jobs = []
+
+        def emit(job: dict):
+            emitted_jobs.append(job)
+            if sink is not None:
+                sink.write(json.dumps(job, ensure_ascii=False) + "\n")
+                sink.flush()
+            if on_job is not None:
+                on_job(job)
+
+        try:
+            job_details = self._extract_with_cache(pdf_path, metadata, document, emit)
+            # Results that did not arrive job by job, such as cache hits, are handed out in one go
+            if not emitted_jobs:
+                for job in parse_job_array(job_details) or []:
+                    emit(job)
+        finally:
+            if sink is not None:
+                sink.close()
+        return job_details
+
+    def _extract_with_cache(self, pdf_path: str, metadata: dict, document: Optional[PdfDocument] = None,
+                            emit: Optional[Callable[[dict], None]] = None) -> Optional[dict]:
+        """
+        Serves a PDF from the response cache, or extracts it and caches the result.
+        Args: pdf_path (str): The path to the PDF file containing job postings.
+        metadata (dict): The per-document metadata to record processing details in.
+        document (PdfDocument | None): The PDF already read and encoded, if available.
+        emit (Callable | None): Receives each job object as soon as it is complete when streaming.
+        Returns: dict | None: The extracted job information or None if the extraction fails.
+        """
+
+        try:
+            cache_key, job_details = self._lookup_cache(pdf_path, metadata, document)
+        except FileNotFoundError:
+            print(f"Error: PDF file not found at '{pdf_path}'. Please ensure the file exists.")
+            return None
+        if job_details is not None:
+            return job_details
+
+        job_details = self._request_job_details(pdf_path, metadata, document, emit)
+        self._store_cache(cache_key, job_details)
+        return job_details
+
+    def _lookup_cache(self, pdf_path: str, metadata: dict,
+                      document: Optional[PdfDocument] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Looks a PDF up in the response cache.
+        Args: pdf_path (str): The path to the PDF file.
+        metadata (dict): The per-document metadata to record the cache outcome in.
+        document (PdfDocument | None): The PDF already read and encoded, if available.
+        Returns: tuple: The cache key, or None without a cache, and the cached job details, or None on a miss.
+        """
+
+        if self.cache is None:
+            return None, None
+
+        cache_key = self.cache.make_key(pdf_path, self.model_name, EXTRACTION_PROMPT, self._cache_variant(),
+                                        pdf_sha256=document.sha256 if document is not None else None)
+        if not self.refresh_cache:
+            job_details = self.cache.get(cache_key)
+            if job_details is not None:
+                metadata["cache"] = "hit"
+                return cache_key, job_details
+
+        metadata["cache"] = "refresh" if self.refresh_cache else "miss"
+        return cache_key, None
+
+    def _store_cache(self, cache_key: Optional[str], job_details: Optional[str]):
+        if cache_key is not None and isinstance(job_details, str):
+            self.cache.put(cache_key, job_details, self.model_name)
+
+    def _cache_variant(self) -> str:
+        """
+        Describes the extraction options that change the result, so they get separate cache entries.
+        """
+
+        options = []
+        if self.pages_per_chunk:
+            options.append(f"pages_per_chunk={self.pages_per_chunk}")
+        if self.pdf_engine:
+            options.append(f"pdf_engine={self.pdf_engine}")
+            if self.pdf_engine == "auto":
+                options.append(f"text_layer_engine={self.text_layer_engine},scanned_engine={self.scanned_engine}")
+        if self.hedge_model:
+            options.append(f"hedge_model={self.hedge_model}")
+        if self.cascade_model:
+            options.append(f"cascade_model={self.cascade_model},cascade_threshold={self.cascade_threshold}")
+        if self._uses_structured_output():
+            options.append("structured_output")
+        return ";".join(options)
+
+    def _request_job_details(self, pdf_path: str, metadata: dict, document: Optional[PdfDocument] = None,
+                             emit: Optional[Callable[[dict], None]] = None) -> Optional[dict]:
+        """
+        Extracts job details from a PDF using the OpenRouter API.
+        Args:  pdf_path (str): The path to the PDF file containing job postings.
+        metadata (dict): The per-document metadata to record processing details in.
+        document (PdfDocument | None): The PDF already read and encoded, if available.
+        emit (Callable | None): Receives each job object as soon as it is complete when streaming.
+        Returns: dict | None: A dictionary containing the extracted job information or None if the extraction fails.
+        """
+
+        if not os.path.isfile(pdf_path):
+            print(f"Error: PDF file not found at '{pdf_path}'. Please ensure the file exists.")
+            return None
+
+        pdf_engine = self._select_pdf_engine(pdf_path, metadata)
+        if self.structured_output:
+            metadata["response_format"] = "json_schema" if self._uses_structured_output() else "prompt"
+        job_details = None
+
+        if self.pages_per_chunk:
+            page_count = count_pages(pdf_path)
+            if page_count and page_count > self.pages_per_chunk:
+                job_details = self._request_split_job_details(pdf_path, pdf_engine, metadata)
+                if job_details is not None:
+                    metadata["page_chunks"] = -(-page_count // self.pages_per_chunk)
+                else:
+                    print(f"Warning: page-split extraction of '{pdf_path}' failed, retrying it as a single document.")
+
+        if job_details is None:
+            started = time.perf_counter()
+            request_body = self._build_request_body(pdf_path, document, pdf_engine=pdf_engine, stream=self.stream)
+            _record_timing(metadata, "serialize", time.perf_counter() - started)
+            if request_body is None:
+                return None
+            continuation = partial(self._build_request_body, pdf_path, document, pdf_engine=pdf_engine)
+            if self.stream:
+                # Streamed jobs are handed out as they arrive, so there is no answer left to escalate
+                return self._send_streaming_request(request_body, emit, metadata, [pdf_path], continuation)
+            if self.hedge_model:
+                job_details = self._send_hedged_request(pdf_path, request_body, metadata, document, pdf_engine)
+            else:
+                job_details = self._send_job_request(request_body, metadata, [pdf_path], continuation=continuation)
+
+        if self.cascade_model:
+            job_details = self._escalate_if_weak(pdf_path, job_details, metadata, document, pdf_engine)
+        return job_details
+
+    def _escalate_if_weak(self, pdf_path: str, job_details: Optional[str], metadata: dict,
+                          document: Optional[PdfDocument] = None, pdf_engine: Optional[str] = None) -> Optional[str]:
+        """
+        Scores an answer and, if it falls below the cascade threshold, extracts the PDF again with the cascade model.
+        The better scoring answer is kept and the path taken is recorded in metadata["cascade"].
+        Args: pdf_path (str): The path to the PDF file.
+        job_details (str | None): The answer of the extractor's model.
+        metadata (dict): The per-document metadata to record processing details in.
+        document (PdfDocument | None): The PDF already read and encoded, if available.
+        pdf_engine (str | None): The PDF engine selected for the document.
+        Returns: str | None: The answer kept.
+        """
+
+        first_score = score_job_details(job_details)
+        cascade = metadata["cascade"] = {
+            "threshold": self.cascade_threshold,
+            "path": [self.model_name],
+            "scores": [first_score],
+            "answered_by": self.model_name,
         }
+        if first_score["score"] >= self.cascade_threshold:
+            return job_details
 
+        request_body = self._build_request_body(pdf_path, document, pdf_engine=pdf_engine, model_name=self.cascade_model)
+        if request_body is None:
+            return job_details
+        continuation = partial(self._build_request_body, pdf_path, document, pdf_engine=pdf_engine,
+                               model_name=self.cascade_model)
+        strong_details = self._send_job_request(request_body, metadata, [pdf_path], self.cascade_model,
+                                                continuation=continuation)
+        strong_score = score_job_details(strong_details)
+        cascade["path"].append(self.cascade_model)
+        cascade["scores"].append(strong_score)
+        # The stronger model wins ties, its answer is the one the cascade exists for
+        if strong_score["score"] >= first_score["score"] and strong_score["valid"]:
+            cascade["answered_by"] = self.cascade_model
+            return strong_details
+        return job_details
+
+    def _request_split_job_details(self, pdf_path: str, pdf_engine: Optional[str] = None,
+                                   metadata: Optional[dict] = None) -> Optional[str]:
+        """
+        Extracts job details from page ranges of a PDF concurrently and merges them back in page order.
+        Args: pdf_path (str): The path to the PDF file containing job postings.
+        pdf_engine (str | None): The PDF engine selected for the document.
+        metadata (dict | None): The per-document metadata to record processing details in.
+        Returns: str | None: The merged JSON array of jobs, or None if any page range could not be extracted.
+        """
+
+        try:
+            chunks = split_pdf_pages(pdf_path, self.pages_per_chunk)
+        except Exception as e:
+            print(f"Error: could not split '{pdf_path}' into pages: {e}")
+            return None
+
+        stem = Path(pdf_path).stem
+
+        def extract_chunk(chunk) -> Optional[list]:
+            first_page, last_page, chunk_bytes = chunk
+            filename = f"{stem}_pages_{first_page}-{last_page}.pdf"
+            started = time.perf_counter()
+            request_body = self._build_request_body(pdf_path, chunk_bytes, filename, pdf_engine)
+            _record_timing(metadata, "serialize", time.perf_counter() - started)
+            continuation = partial(self._build_request_body, pdf_path, chunk_bytes, filename, pdf_engine)
+            return parse_job_array(self._send_job_request(request_body, metadata, [pdf_path], continuation=continuation))
+
+        # Every range is in flight at once, so the slowest range sets the latency of the document
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            chunk_jobs = list(executor.map(_in_context(extract_chunk), chunks))
+
+        if any(jobs is None for jobs in chunk_jobs):
+            return None
+        return json.dumps(merge_job_chunks(chunk_jobs), indent=4, ensure_ascii=False)
+
+    def _start_request_record(self, request_body: Union["StreamingPdfBody", bytes],
+                              documents: Optional[List[str]] = None, model_name: Optional[str] = None) -> dict:
+        """
+        Starts the metrics record of an OpenRouter call.
+        Args: request_body (StreamingPdfBody | bytes): The request body about to be sent.
+        documents (list | None): The paths of the PDFs the request covers.
+        model_name (str | None): The model asked, defaulting to the extractor's model.
+        Returns: dict: The record, with every field of metrics.REQUEST_METRIC_FIELDS.
+        """
+
+        return {
+            "started": time.time(),
+            "model": model_name or self.model_name,
+            "documents": [Path(pdf_path).name for pdf_path in documents or ()],
+            "status": None,
+            "error": None,
+            "retries": 0,
+            "wall_seconds": None,
+            "request_bytes": len(request_body),
+            "response_bytes": None,
+            "generation_id": None,
+            "finish_reason": None,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "total_tokens": None,
+            "cost": None,
+        }
+
+    def _finish_request_record(self, request_record: dict, started: float, metadata: Optional[dict] = None):
+        """
+        Completes the metrics record of an OpenRouter call and hands it to the on_request hook.
+        Args: request_record (dict): The record returned by _start_request_record.
+        started (float): The perf_counter reading taken before the request was sent.
+        metadata (dict | None): The per-document metadata to add the usage to.
+        """
+
+        request_record["wall_seconds"] = time.perf_counter() - started
+        _record_usage(metadata, request_record)
+        if self.on_request is None:
+            return
         try:
-            response = requests.post(self.url, headers=headers, json=payload)
+            self.on_request(request_record)
+        except Exception as e:
+            # Losing a metrics record is better than losing the extraction
+            print(f"Warning: the metrics hook failed: {e}")
+
+    @staticmethod
+    def _read_usage(request_record: dict, response_data: dict):
+        """
+        Copies the generation id, finish reason and usage block of an OpenRouter response or stream event.
+        Args: request_record (dict): The metrics record of the request.
+        response_data (dict): The parsed response or event.
+        """
+
+        if response_data.get("id"):
+            request_record["generation_id"] = response_data["id"]
+        choices = response_data.get("choices") or []
+        if choices and choices[0].get("finish_reason"):
+            request_record["finish_reason"] = choices[0]["finish_reason"]
+        usage = response_data.get("usage") or {}
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens", "cost"):
+            if usage.get(field) is not None:
+                request_record[field] = usage[field]
+
+    def _post_with_retries(self, request_body: Union["StreamingPdfBody", bytes], stream: bool = False,
+                           request_record: Optional[dict] = None, cancelled: Optional[threading.Event] = None,
+                           sent: Optional[threading.Event] = None) -> requests.Response:
+        """
+        Posts a request to OpenRouter under the rate limiter, retrying throttled and transient failures.
+        Args: request_body (StreamingPdfBody | bytes): The request body built by _build_request_body.
+        stream (bool): Whether to return as soon as the headers arrive and leave the body to be read incrementally.
+        The request then keeps its concurrency slot until the response is closed, which the caller must do.
+        request_record (dict | None): The metrics record to count the retries and the final status in.
+        cancelled (threading.Event | None): Once set, no further attempts are made.
+        sent (threading.Event | None): Set once the request holds its slot and goes out.
+        Returns: requests.Response: The final response, which may still be an error once the retries are used up.
+        """
+
+        attempt = 0
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise RequestCancelled("Another request answered first")
+            if request_record is not None:
+                request_record["retries"] = attempt
+            retry_after = None
+            slot_handed_over = False
+            self.rate_limiter.acquire()
+            if sent is not None:
+                sent.set()
+            try:
+                response = self.session.post(self.url, data=request_body, stream=stream, timeout=self.request_timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.rate_limiter.max_retries:
+                    raise
+                failure = str(e)
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.rate_limiter.max_retries:
+                    if request_record is not None:
+                        request_record["status"] = response.status_code
+                    if stream:
+                        # Only the headers are in, the model is still generating the body
+                        self._release_slot_on_close(response)
+                        slot_handed_over = True
+                    return response
+                failure = f"HTTP {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+            finally:
+                if not slot_handed_over:
+                    self.rate_limiter.release()
+
+            delay = self.rate_limiter.on_throttle(attempt, retry_after)
+            attempt += 1
+            print(f"Warning: OpenRouter request failed ({failure}), retry {attempt}/{self.rate_limiter.max_retries} in {delay:.1f}s.")
+            time.sleep(delay)
+
+    def _release_slot_on_close(self, response: requests.Response):
+        """
+        Frees the rate limiter's concurrency slot once a streamed response is closed, however often that happens.
+        Args: response (requests.Response): The streamed response holding the slot.
+        """
+
+        close = response.close
+        release_once = threading.Lock()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if release_once.acquire(blocking=False):
+                    self.rate_limiter.release()
+
+        response.close = close_and_release
+
+    def _send_request(self, request_body: Union["StreamingPdfBody", bytes], metadata: Optional[dict] = None,
+                      documents: Optional[List[str]] = None, model_name: Optional[str] = None,
+                      cancelled: Optional[threading.Event] = None,
+                      sent: Optional[threading.Event] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Sends an extraction request to OpenRouter and returns the model's answer.
+        Args: request_body (StreamingPdfBody | bytes): The request body built by _build_request_body.
+        metadata (dict | None): The per-document metadata to record timings and usage in.
+        documents (list | None): The paths of the PDFs the request covers, for the metrics record.
+        model_name (str | None): The model the body was built for, if not the extractor's model.
+        cancelled (threading.Event | None): Once set, the request is abandoned as soon as possible.
+        sent (threading.Event | None): Set once the request holds its slot and goes out.
+        Returns: tuple: The model's answer as sent, or None if the request fails, and the finish reason.
+        """
+
+        response = None
+        request_record = self._start_request_record(request_body, documents, model_name)
+        started = time.perf_counter()
+        try:
+            # A request that may be abandoned only waits for the headers, so the body is not downloaded in vain
+            response = self._post_with_retries(request_body, stream=cancelled is not None,
+                                               request_record=request_record, cancelled=cancelled, sent=sent)
+            if cancelled is not None and cancelled.is_set():
+                response.close()
+                raise RequestCancelled("Another request answered first")
+            body_started = time.perf_counter()
+            request_record["response_bytes"] = len(response.content)
+            # A streamed response only had its headers when elapsed was taken, the body counts towards the latency too
+            latency = response.elapsed.total_seconds() + time.perf_counter() - body_started
+            _record_body_timings(metadata, request_body, time.perf_counter() - started)
             response.raise_for_status()  
+            parse_started = time.perf_counter()
             response_data = response.json()
+            _record_timing(metadata, "parse", time.perf_counter() - parse_started)
+            self._read_usage(request_record, response_data)
+            self.rate_limiter.on_success(latency, request_record["total_tokens"])
 
-            # Extract and return the actual text content (which should be JSON)
+            # Return the actual text content, which _send_job_request parses and validates
             if response_data.get("choices") and len(response_data["choices"]) > 0:
                 message_content = response_data["choices"][0]["message"].get("content")
                 if message_content:
-                    try:
-                        if message_content.startswith("```json") and message_content.endswith("```"):
-                            message_content = message_content.strip("```json").strip("```").strip()
-
-                        return message_content
-                    except json.JSONDecodeError:
-                        print("Warning: Model did not return clean JSON. Returning raw text content.")
-                        return {"raw_output": message_content}
+                    return message_content, request_record["finish_reason"]
                 else:
                     print("No text content found in the response.")
-                    return None
+                    return None, None
             else:
                 print("No choices found in the response.")
-                return None
+                return None, None
 
+        except RequestCancelled as e:
+            request_record["error"] = str(e)
+            return None, None
         except requests.exceptions.RequestException as e:
+            request_record["error"] = str(e)
             print(f"Request failed: {e}")
             if response is not None:
                 print(f"Response status code: {response.status_code}")
                 print(f"Response text: {response.text}")
-            return None
+            return None, None
         except json.JSONDecodeError as e:
+            request_record["error"] = f"Invalid JSON response: {e}"
             print(f"Error decoding JSON response from API: {e}")
             if response is not None:
                 print(f"Raw response text: {response.text}")
+            return None, None
+        finally:
+            if response is not None:
+                # Hands the connection and, for a streamed response, the concurrency slot back
+                response.close()
+            self._finish_request_record(request_record, started, metadata)
+
+    def _current_hedge_delay(self) -> float:
+        """
+        Returns how long to wait for the model before hedging: the configured percentile of recent response times,
+        or the fixed hedge delay until enough of them are known.
+        """
+
+        with self._latency_lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 20:
+            return self.hedge_delay
+        rank = min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))
+        return latencies[rank]
+
+    def _size_hedge_executor(self, documents_in_flight: int = 4) -> ThreadPoolExecutor:
+        """
+        Returns the executor hedged requests run in, replacing it with a larger one if it cannot serve a batch with
+        this many documents in flight: a model and a hedge request for each of them, plus as many abandoned ones
+        still winding down.
+        Args: documents_in_flight (int): The number of documents extracted at once.
+        Returns: ThreadPoolExecutor: The executor to submit hedged requests to.
+        """
+
+        workers = 4 * max(documents_in_flight, 1)
+        with self._hedge_lock:
+            if workers > self._hedge_workers:
+                previous = self._hedge_executor
+                self._hedge_executor = ThreadPoolExecutor(max_workers=workers)
+                self._hedge_workers = workers
+                if previous is not None:
+                    # Requests already running there finish on their own
+                    previous.shutdown(wait=False)
+            return self._hedge_executor
+
+    def _send_hedged_request(self, pdf_path: str, request_body: Union["StreamingPdfBody", bytes], metadata: dict,
+                             document: Optional[PdfDocument] = None, pdf_engine: Optional[str] = None) -> Optional[str]:
+        """
+        Sends a request to the model and, if it has not answered within the hedge delay or answered with something
+        other than a job array, the same document to the hedge model. The first valid job array wins and the other
+        request is abandoned.
+        Args: pdf_path (str): The path to the PDF file.
+        request_body (StreamingPdfBody | bytes): The request body built for the extractor's model.
+        metadata (dict): The per-document metadata to record processing details in.
+        document (PdfDocument | None): The PDF already read and encoded, if available.
+        pdf_engine (str | None): The PDF engine selected for the document.
+        Returns: str | None: The winning answer, or None if neither model returned a job array.
+        """
+
+        cancelled = threading.Event()
+        attempts: Dict[Future, Tuple[str, dict]] = {}
+        executor = self._hedge_executor or self._size_hedge_executor()
+
+        def submit(model_name: str, body: Union["StreamingPdfBody", bytes],
+                   sent: Optional[threading.Event] = None) -> Future:
+            # Each model gets its own metadata, so only the winner's timings and usage are kept
+            attempt_metadata: dict = {}
+            continuation = partial(self._build_request_body, pdf_path, document, pdf_engine=pdf_engine,
+                                   model_name=model_name)
+            future = executor.submit(_in_context(self._send_job_request), body, attempt_metadata,
+                                     [pdf_path], model_name, cancelled, continuation, sent)
+            attempts[future] = (model_name, attempt_metadata)
+            return future
+
+        def answer(future: Future) -> Optional[str]:
+            try:
+                job_details = future.result()
+            except Exception as e:
+                print(f"Warning: hedged request for '{pdf_path}' failed: {e}")
+                return None
+            return job_details if parse_job_array(job_details) is not None else None
+
+        # The hedge delay counts from the moment the request goes out, not while it waits for a thread or a slot
+        sent = threading.Event()
+        sent_at: List[float] = []
+
+        def record_latency(future: Future):
+            # Abandoned requests count too, or the delay would only ever learn from the fast ones
+            if sent_at and (cancelled.is_set() or answer(future) is not None):
+                with self._latency_lock:
+                    self._latencies.append(time.perf_counter() - sent_at[0])
+
+        primary = submit(self.model_name, request_body, sent)
+        # A request that fails before it is sent must not leave the wait below hanging
+        primary.add_done_callback(lambda _: sent.set())
+        sent.wait()
+        sent_at.append(time.perf_counter())
+        primary.add_done_callback(record_latency)
+        delay = self._current_hedge_delay()
+        try:
+            primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pending = {primary}
+            winner = None
+        else:
+            pending = set()
+            winner = primary if answer(primary) is not None else None
+
+        if winner is None:
+            backup_body = self._build_request_body(pdf_path, document, pdf_engine=pdf_engine, model_name=self.hedge_model)
+            if backup_body is not None:
+                metadata["hedge"] = {"model": self.hedge_model, "delay": round(delay, 3)}
+                pending.add(submit(self.hedge_model, backup_body))
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                winner = next((future for future in done if answer(future) is not None), None)
+        cancelled.set()
+        if winner is None:
             return None
 
-if __name__ == "__main__":
-    # pdf_file_path = "Input\\PDF5.pdf"
+        model_name, attempt_metadata = attempts[winner]
+        for stage, seconds in attempt_metadata.pop("timings", {}).items():
+            _record_timing(metadata, stage, seconds)
+        metadata.update(attempt_metadata)
+        if "hedge" in metadata:
+            metadata["hedge"]["winner"] = model_name
+        return winner.result()
+
+    def _send_streaming_request(self, request_body: Union["StreamingPdfBody", bytes],
+                                emit: Optional[Callable[[dict], None]] = None,
+                                metadata: Optional[dict] = None,
+                                documents: Optional[List[str]] = None,
+                                continuation: Optional[Callable[..., Optional[Union["StreamingPdfBody", bytes]]]] = None
+                                ) -> Optional[str]:
+        """
+        Sends a streaming extraction request and parses the job array while the completion arrives.
+        Args: request_body (StreamingPdfBody | bytes): The request body built with stream=True.
+        emit (Callable | None): Receives each job object as soon as its closing brace arrives.
+        metadata (dict | None): The per-document metadata to record timings and usage in.
+        documents (list | None): The paths of the PDFs the request covers, for the metrics record.
+        continuation (Callable | None): Builds the body of a continuation request, see _send_job_request.
+        Returns: str | None: The assembled JSON array of jobs, or None if the request fails.
+        """
+
+        parser = IncrementalJobArrayParser()
+        content_parts = []
+        response = None
+        parse_seconds = 0.0
+        request_record = self._start_request_record(request_body, documents)
+        request_record["response_bytes"] = 0
+        started = time.perf_counter()
+        try:
+            response = self._post_with_retries(request_body, stream=True, request_record=request_record)
+            body_started = time.perf_counter()
+            # Entered before checking the status, so an error response hands its connection and slot back too
+            with response:
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=None):
+                    request_record["response_bytes"] += len(line) + 1
+                    # Blank lines separate events and lines starting with ':' are keep-alive comments
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:"):].strip()
+                    if data == b"[DONE]":
+                        break
+
+                    parse_started = time.perf_counter()
+                    event = json.loads(data)
+                    if event.get("error"):
+                        request_record["error"] = str(event["error"])
+                        print(f"Stream failed: {event['error']}")
+                        return None
+                    self._read_usage(request_record, event)
+                    choices = event.get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    completed_jobs = []
+                    if delta:
+                        content_parts.append(delta)
+                        completed_jobs = parser.feed(delta)
+                    parse_seconds += time.perf_counter() - parse_started
+                    _emit_validated(emit, completed_jobs)
+            # The latency of a stream runs until its last event, not until the headers
+            self.rate_limiter.on_success(response.elapsed.total_seconds() + time.perf_counter() - body_started,
+                                         request_record["total_tokens"])
+            _record_body_timings(metadata, request_body, time.perf_counter() - started - parse_seconds)
+            _record_timing(metadata, "parse", parse_seconds)
+
+        except requests.exceptions.RequestException as e:
+            request_record["error"] = str(e)
+            print(f"Request failed: {e}")
+            if response is not None:
+                print(f"Response status code: {response.status_code}")
+            return None
+        except json.JSONDecodeError as e:
+            request_record["error"] = f"Invalid stream event: {e}"
+            print(f"Error decoding streamed event from API: {e}")
+            return None
+        finally:
+            self._finish_request_record(request_record, started, metadata)
+
+        message_content = "".join(content_parts)
+        if not message_content:
+            print("No text content found in the response.")
+            return None
+        if request_record["finish_reason"] == "length" and continuation is not None:
+            # The jobs handed out so far stay handed out, the continuations only add the missing ones
+            message_content = self._continue_truncated(message_content, continuation, metadata, documents, emit=emit)
+        # The jobs are already handed out, so a broken answer is repaired where possible but not requested again
+        return self._validate_answer(message_content, metadata)
+
+    def _continue_truncated(self, content: str,
+                            continuation: Callable[..., Optional[Union["StreamingPdfBody", bytes]]],
+                            metadata: Optional[dict] = None, documents: Optional[List[str]] = None,
+                            model_name: Optional[str] = None, cancelled: Optional[threading.Event] = None,
+                            emit: Optional[Callable[[dict], None]] = None) -> str:
+        """
+        Completes an answer cut off by the output length limit: the jobs it finished are kept, and the model is
+        asked to go on from the last of them rather than to start over, up to max_continuations times.
+        Args: content (str): The cut off answer.
+        continuation (Callable): Builds the body of a continuation request from the answer so far.
+        metadata (dict | None): The per-document metadata to record timings, usage and continuations in.
+        documents (list | None): The paths of the PDFs the request covers, for the metrics record.
+        model_name (str | None): The model the answer came from, if not the extractor's model.
+        cancelled (threading.Event | None): Once set, the request is abandoned as soon as possible.
+        emit (Callable | None): Receives each job the continuations add.
+        Returns: str: The stitched JSON array, still open at the end if the answer could not be completed,
+        so validation keeps its complete jobs as it would for any cut off answer.
+        """
+
+        parser = IncrementalJobArrayParser()
+        jobs = parser.feed(content)
+        for _ in range(self.max_continuations):
+            # The answer so far, cut after its last complete job
+            partial_answer = json.dumps(jobs, ensure_ascii=False)[:-1]
+            request_body = continuation(partial_answer=partial_answer)
+            if request_body is None:
+                break
+            answer, finish_reason = self._send_request(request_body, metadata, documents, model_name, cancelled)
+            if answer is None:
+                break
+            if metadata is not None:
+                with _metadata_lock:
+                    metadata["continuations"] = metadata.get("continuations", 0) + 1
+
+            started = time.perf_counter()
+            new_jobs = [job for job in parse_job_fragment(answer, JOB_SCHEMA.wrapper_key) if job not in jobs]
+            _record_timing(metadata, "parse", time.perf_counter() - started)
+            jobs += new_jobs
+            _emit_validated(emit, new_jobs)
+            if finish_reason != "length":
+                return json.dumps(jobs, ensure_ascii=False)
+            if not new_jobs:
+                print("Warning: the continuation of a cut off answer added no jobs, keeping the jobs so far.")
+                break
+        return json.dumps(jobs, ensure_ascii=False)[:-1]
+
+    def _validate_answer(self, content: str, metadata: Optional[dict] = None) -> Optional[str]:
+        """
+        Parses, repairs and validates a model answer against JOB_SCHEMA.
+        Args: content (str): The model's answer.
+        metadata (dict | None): The per-document metadata to record repairs and errors in.
+        Returns: str | None: The normalized JSON array of jobs, or None if the answer is unusable.
+        """
+
+        started = time.perf_counter()
+        jobs, report = JOB_SCHEMA.parse(content)
+        _record_timing(metadata, "parse", time.perf_counter() - started)
+        if metadata is not None and (report["repairs"] or report["errors"]):
+            with _metadata_lock:
+                validation = metadata.setdefault("validation", {"repairs": [], "errors": []})
+                validation["repairs"] += report["repairs"]
+                validation["errors"] += report["errors"]
+        if jobs is None:
+            print(f"Warning: the model's answer is not a valid job array: {'; '.join(report['errors'])}")
+            return None
+        return json.dumps(jobs, indent=4, ensure_ascii=False)
+
+    def _send_job_request(self, request_body: Union["StreamingPdfBody", bytes], metadata: Optional[dict] = None,
+                          documents: Optional[List[str]] = None, model_name: Optional[str] = None,
+                          cancelled: Optional[threading.Event] = None,
+                          continuation: Optional[Callable[..., Optional[Union["StreamingPdfBody", bytes]]]] = None,
+                          sent: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Sends an extraction request and validates the answer, continuing it when it was cut off and asking again
+        when it cannot be repaired.
+        Args: request_body (StreamingPdfBody | bytes): The request body built by _build_request_body.
+        metadata (dict | None): The per-document metadata to record timings, usage and repairs in.
+        documents (list | None): The paths of the PDFs the request covers, for the metrics record.
+        model_name (str | None): The model the body was built for, if not the extractor's model.
+        cancelled (threading.Event | None): Once set, the request is abandoned as soon as possible.
+        continuation (Callable | None): Builds the body of a continuation request from the answer so far,
+        _build_request_body with everything but partial_answer bound. Cut off answers are not continued without it.
+        sent (threading.Event | None): Set once the first request holds its slot and goes out.
+        Returns: str | None: The normalized JSON array of jobs, or None if no valid answer was received.
+        """
+
+        for attempt in range(self.invalid_answer_retries + 1):
+            if attempt:
+                print(f"Retrying with a fresh answer, attempt {attempt + 1}/{self.invalid_answer_retries + 1}.")
+            content, finish_reason = self._send_request(request_body, metadata, documents, model_name, cancelled, sent)
+            if content is None:
+                # Transport failures were already retried, asking again would not help
+                return None
+            if finish_reason == "length" and continuation is not None:
+                content = self._continue_truncated(content, continuation, metadata, documents, model_name, cancelled)
+            job_details = self._validate_answer(content, metadata)
+            if job_details is not None:
+                return job_details
+            if cancelled is not None and cancelled.is_set():
+                return None
+        return None
+
+    def _plan_packs(self, pdf_paths: List[str]) -> List[List[str]]:
+        """
+        Groups PDFs into requests: small PDFs are packed together within the byte, page and file budgets,
+        everything else goes on its own.
+        Args: pdf_paths (list): The paths to the PDF files.
+        Returns: list: The groups of PDF paths, one per request, in input order of their first member.
+        """
+
+        if not self.pack_max_bytes:
+            return [[pdf_path] for pdf_path in pdf_paths]
+
+        groups: List[List[str]] = []
+        pack: List[str] = []
+        pack_bytes = pack_pages = 0
+        for pdf_path in pdf_paths:
+            try:
+                size = os.path.getsize(pdf_path)
+            except OSError:
+                groups.append([pdf_path])
+                continue
+            page_count = count_pages(pdf_path) if self.pack_max_pages or self.pages_per_chunk else None
+            pages = (page_count or self.pack_max_pages + 1) if self.pack_max_pages else 0
+            # PDFs long enough to be split into page ranges are extracted on their own, as they would be unpacked
+            split = self.pages_per_chunk and page_count and page_count > self.pages_per_chunk
+            if size > self.pack_max_bytes or (self.pack_max_pages and pages > self.pack_max_pages) or split:
+                groups.append([pdf_path])
+                continue
+
+            # Files are told apart by name in the answer, so a pack never holds two files of the same name
+            if pack and (pack_bytes + size > self.pack_max_bytes
+                         or (self.pack_max_pages and pack_pages + pages > self.pack_max_pages)
+                         or len(pack) >= self.pack_max_files
+                         or Path(pdf_path).name in {Path(p).name for p in pack}):
+                groups.append(pack)
+                pack, pack_bytes, pack_pages = [], 0, 0
+            pack.append(pdf_path)
+            pack_bytes += size
+            pack_pages += pages
+        if pack:
+            groups.append(pack)
+        return groups
+
+    def _build_packed_request_body(self, pdf_paths: List[str]) -> ConcatenatedBody:
+        """
+        Builds one request body carrying several PDFs, each introduced by a delimiter naming the file.
+        Args: pdf_paths (list): The paths to the PDF files.
+        Returns: ConcatenatedBody: The streamed request body.
+        """
+
+        content = [{"type": "text", "text": f"{EXTRACTION_PROMPT}\n\n{PACKED_EXTRACTION_INSTRUCTIONS}"}]
+        for index, pdf_path in enumerate(pdf_paths):
+            content.append({"type": "text", "text": f"=== FILE: {Path(pdf_path).name} ==="})
+            content.append({
+                "type": "file",
+                "file": {
+                    "filename": Path(pdf_path).name,
+                    "file_data": f"data:application/pdf;base64,{_DOCUMENT_PLACEHOLDER}{index}__"
+                }
+            })
+
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": content}],
+            "usage": {"include": True}
+        }
+        if self.pdf_engine in PDF_ENGINES:
+            payload["plugins"] = [{"id": "file-parser", "pdf": {"engine": self.pdf_engine}}]
+
+        serialized = json.dumps(payload).encode("utf-8")
+        parts = []
+        for index, pdf_path in enumerate(pdf_paths):
+            prefix, serialized = serialized.split(f"{_DOCUMENT_PLACEHOLDER}{index}__".encode("ascii"))
+            parts.append(StreamingPdfBody(prefix, pdf_path, b""))
+        parts[-1].suffix = serialized
+        return ConcatenatedBody(parts)
+
+    def extract_packed(self, pdf_paths: List[str],
+                       metadata_by_path: Optional[Dict[str, dict]] = None) -> Dict[str, Optional[str]]:
+        """
+        Extracts job details from several small PDFs with a single request, and splits the answer back into
+        one result per file. Files whose part of the answer cannot be split out are retried on their own.
+        Args: pdf_paths (list): The paths to the PDF files, with distinct filenames.
+        metadata_by_path (dict | None): A dictionary that receives the per-document metadata of each PDF.
+        Returns: dict: A mapping of each PDF path to its extracted job details, or None where extraction failed.
+        """
+
+        if metadata_by_path is None:
+            metadata_by_path = {}
+        results: Dict[str, Optional[str]] = {}
+        cache_keys: Dict[str, Optional[str]] = {}
+        pending: List[str] = []
+        for pdf_path in pdf_paths:
+            metadata = metadata_by_path.setdefault(pdf_path, {})
+            metadata["model"] = self.model_name
+            try:
+                cache_keys[pdf_path], job_details = self._lookup_cache(pdf_path, metadata)
+            except FileNotFoundError:
+                print(f"Error: PDF file not found at '{pdf_path}'. Please ensure the file exists.")
+                results[pdf_path] = None
+                continue
+            if job_details is not None:
+                results[pdf_path] = job_details
+            else:
+                pending.append(pdf_path)
+
+        packed_answer = None
+        if len(pending) > 1:
+            # A cut off packed answer is not continued, its files fall back to requests of their own
+            packed_answer = _parse_json_object(self._send_request(self._build_packed_request_body(pending),
+                                                                  documents=pending)[0])
+            if packed_answer is None:
+                print(f"Warning: could not split the packed answer for {len(pending)} PDFs, extracting them one by one.")
+
+        for pdf_path in pending:
+            metadata = metadata_by_path[pdf_path]
+            jobs = packed_answer.get(Path(pdf_path).name) if packed_answer is not None else None
+            if isinstance(jobs, list):
+                jobs = JOB_SCHEMA.validate(jobs)[0]
+            if jobs is not None:
+                job_details = json.dumps(jobs, indent=4, ensure_ascii=False)
+                metadata["packed_with"] = len(pending)
+            else:
+                if packed_answer is not None:
+                    metadata["pack_fallback"] = True
+                job_details = self._request_job_details(pdf_path, metadata)
+            self._store_cache(cache_keys[pdf_path], job_details)
+            results[pdf_path] = job_details
+        return results
+
+    def _prepare_connections(self, concurrency: int, request_count: int):
+        """
+        Keeps one pooled connection per in-flight request and opens them before the first upload. With a hedge
+        model, the hedge executor is sized for the batch as well.
+        Args: concurrency (int): The number of requests that will be in flight at once.
+        request_count (int): The number of requests about to be made.
+        """
+
+        if concurrency > self.pool_size:
+            self._mount_connection_pool(concurrency)
+        if self.hedge_model:
+            self._size_hedge_executor(concurrency)
+        self.warm_up(min(concurrency, request_count))
+
+    async def extract_many(self, pdf_paths: Iterable[str], concurrency: int = 4,
+                           on_result: Optional[Callable[[str, Optional[str], dict], None]] = None) -> Dict[str, Optional[str]]:
+        """
+        Extracts job details from several PDFs concurrently, keeping up to `concurrency` requests in flight
+        and sending them in the order of the extractor's schedule.
+        Args: pdf_paths (Iterable[str]): The paths to the PDF files.
+        concurrency (int): The maximum number of OpenRouter requests in flight at once.
+        on_result (Callable | None): Called with (pdf_path, job_details, metadata) as soon as each PDF finishes.
+        Returns: dict: A mapping of each PDF path to its extracted job details, or None where extraction failed.
+        """
+
+        pdf_paths = list(pdf_paths)
+        results: Dict[str, Optional[str]] = {}
+        if not pdf_paths:
+            return results
+
+        groups = self._plan_packs(pdf_paths)
+        self._prepare_connections(concurrency, len(groups))
+        loop = asyncio.get_running_loop()
+
+        async def run_one(pdf_path: str):
+            metadata: dict = {}
+            try:
+                job_details = await loop.run_in_executor(executor, _in_context(self.extract_job_details),
+                                                         pdf_path, metadata)
+            except Exception as e:
+                print(f"Extraction of '{pdf_path}' failed: {e}")
+                job_details = None
+            results[pdf_path] = job_details
+            if on_result is not None:
+                on_result(pdf_path, job_details, metadata)
+
+        async def run_pack(pack: List[str]):
+            metadata_by_path: Dict[str, dict] = {}
+            try:
+                pack_results = await loop.run_in_executor(executor, _in_context(self.extract_packed),
+                                                          pack, metadata_by_path)
+            except Exception as e:
+                print(f"Packed extraction of {len(pack)} PDFs failed: {e}")
+                pack_results = {}
+            for pdf_path in pack:
+                results[pdf_path] = pack_results.get(pdf_path)
+                if on_result is not None:
+                    on_result(pdf_path, results[pdf_path], metadata_by_path.get(pdf_path, {}))
+
+        async def worker():
+            # Each worker keeps one request in flight and takes the next one the schedule picks
+            while True:
+                group = scheduler.pop()
+                if group is None:
+                    return
+                payload_bytes = encoded_payload_size(group) if self.byte_budget is not None else 0
+                if payload_bytes:
+                    # The budget may be shared with other extractors and threads, so the wait blocks a worker thread
+                    await loop.run_in_executor(executor, self.byte_budget.acquire, payload_bytes)
+                try:
+                    await (run_one(group[0]) if len(group) == 1 else run_pack(group))
+                finally:
+                    if payload_bytes:
+                        self.byte_budget.release(payload_bytes)
+
+        # The whole batch is pushed before the first pop, so sjf aging has no late arrivals to act on
+        scheduler = BatchScheduler(self.schedule)
+        # The HTTP client is blocking, so each in-flight request gets its own worker thread
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups)))) as executor:
+            if self.schedule == "fifo":
+                costs = [None] * len(groups)
+            else:
+                costs = await asyncio.gather(*(loop.run_in_executor(executor, _in_context(estimate_cost), group)
+                                               for group in groups))
+            for group, cost in zip(groups, costs):
+                scheduler.push(group, cost)
+            await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(groups))))))
+        return results
+
+
+def encoded_payload_size(pdf_paths: Iterable[str]) -> int:
+    """
+    Estimates the bytes a request's PDFs take up once base64-encoded, as charged against a ByteBudget.
+    Args: pdf_paths (Iterable[str]): The PDFs sent in the request.
+    Returns: int: The encoded size in bytes, leaving out files that do not exist.
+    """
+
+    total = 0
+    for pdf_path in pdf_paths:
+        try:
+            total += 4 * ((os.path.getsize(pdf_path) + 2) // 3)
+        except OSError:
+            continue
+    return total
+
+
+def model_output_dir(model_name: str, output_dir: str = "Output") -> str:
+    """
+    Names the per-model output directory, e.g. "Output (openai_gpt-4o)" for "openai/gpt-4o".
+    Args: model_name (str): The OpenRouter model name.
+    output_dir (str): The base name of the output directories.
+    Returns: str: The output directory for the model.
+    """
+
+    return f"{output_dir} ({model_name.replace('/', '_')})"
+
+
+async def extract_with_models(extractors: List[JobPostingExtractor], pdf_paths: Iterable[str], concurrency: int = 4,
+                              on_result: Optional[Callable[[str, str, Optional[str], dict], None]] = None,
+                              schedule: str = "fifo") -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Extracts job details from several PDFs with several models in one pass. Each PDF is read and encoded once
+    and shared by all models, and each model keeps up to `concurrency` requests of its own in flight.
+    Args: extractors (list): One JobPostingExtractor per model.
+    pdf_paths (Iterable[str]): The paths to the PDF files.
+    concurrency (int): The maximum number of requests in flight per model.
+    on_result (Callable | None): Called with (model_name, pdf_path, job_details, metadata) as soon as each extraction finishes.
+    schedule (str): The order the PDFs are read in, see scheduler.BatchScheduler. The whole batch is known up front,
+    so the order is settled before the first request.
+    Returns: dict: A mapping of each model name to its mapping of PDF paths to extracted job details.
+    """
+
+    pdf_paths = list(pdf_paths)
+    results: Dict[str, Dict[str, Optional[str]]] = {extractor.model_name: {} for extractor in extractors}
+    if not pdf_paths or not extractors:
+        return results
+
+    for extractor in extractors:
+        extractor._prepare_connections(concurrency, len(pdf_paths))
+
+    loop = asyncio.get_running_loop()
+    model_semaphores = {id(extractor): asyncio.Semaphore(concurrency) for extractor in extractors}
+    # Bounds how many encoded PDFs are held in memory while the slowest model catches up
+    document_semaphore = asyncio.Semaphore(2 * concurrency)
+
+    async def run_model(extractor: JobPostingExtractor, pdf_path: str, document: Optional[PdfDocument]):
+        metadata: dict = {}
+        async with model_semaphores[id(extractor)]:
+            try:
+                job_details = await loop.run_in_executor(executor, extractor.extract_job_details,
+                                                         pdf_path, metadata, document)
+            except Exception as e:
+                print(f"Extraction of '{pdf_path}' with {extractor.model_name} failed: {e}")
+                job_details = None
+        results[extractor.model_name][pdf_path] = job_details
+        if on_result is not None:
+            on_result(extractor.model_name, pdf_path, job_details, metadata)
+
+    # Every model sends the same encoded document, so it is charged to the budget once
+    byte_budget = extractors[0].byte_budget
+
+    async def run_document(pdf_path: str):
+        async with document_semaphore:
+            payload_bytes = encoded_payload_size([pdf_path]) if byte_budget is not None else 0
+            if payload_bytes:
+                await loop.run_in_executor(executor, byte_budget.acquire, payload_bytes)
+            try:
+                try:
+                    document = await loop.run_in_executor(executor, PdfDocument, pdf_path)
+                except OSError as e:
+                    print(f"Error: could not read '{pdf_path}': {e}")
+                    document = None
+                await asyncio.gather(*(run_model(extractor, pdf_path, document) for extractor in extractors))
+            finally:
+                if payload_bytes:
+                    byte_budget.release(payload_bytes)
+
+    max_workers = concurrency * len(extractors) + 2 * concurrency
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if schedule != "fifo":
+            scheduler = BatchScheduler(schedule)
+            costs = await asyncio.gather(*(loop.run_in_executor(executor, estimate_cost, [pdf_path])
+                                           for pdf_path in pdf_paths))
+            for pdf_path, cost in zip(pdf_paths, costs):
+                scheduler.push(pdf_path, cost)
+            pdf_paths = [scheduler.pop() for _ in range(len(pdf_paths))]
+        # The document semaphore wakes its waiters in order, so the documents are read in the order given
+        await asyncio.gather(*(run_document(pdf_path) for pdf_path in pdf_paths))
+    return results
+
+
+async def extract_from_queue(extractor: JobPostingExtractor, queue: JobQueue, concurrency: int = 4,
+                             on_result: Optional[Callable[[str, Optional[str], dict], Optional[Path]]] = None
+                             ) -> Dict[str, Optional[str]]:
+    """
+    Works through the pending jobs of the extractor's model in a JobQueue, with `concurrency` workers that each
+    lease one PDF at a time and record it as done or failed, so an interrupted run can be resumed.
+    Args: extractor (JobPostingExtractor): The extractor to run.
+    queue (JobQueue): The queue holding the jobs.
+    concurrency (int): The number of workers.
+    on_result (Callable | None): Called with (pdf_path, job_details, metadata) when a PDF finishes. It may return the
+    path the result was written to, which is stored with the job.
+    Returns: dict: A mapping of each PDF path processed in this run to its extracted job details.
+    """
+
+    results: Dict[str, Optional[str]] = {}
+    model_name = extractor.model_name
+    extractor._prepare_connections(concurrency, concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        while True:
+            claimed = await loop.run_in_executor(executor, queue.claim, model_name)
+            if claimed is None:
+                lease_expiry = await loop.run_in_executor(executor, queue.next_lease_expiry, model_name)
+                if lease_expiry is None:
+                    return
+                # Jobs still in flight either finish, or are handed out again once their lease runs out
+                await asyncio.sleep(min(QUEUE_POLL_SECONDS, max(0.0, lease_expiry - time.time())))
+                continue
+            pdf_path, lease = claimed
+
+            metadata: dict = {}
+            payload_bytes = encoded_payload_size([pdf_path]) if extractor.byte_budget is not None else 0
+            if payload_bytes:
+                await loop.run_in_executor(executor, extractor.byte_budget.acquire, payload_bytes)
+            try:
+                job_details = await loop.run_in_executor(executor, extractor.extract_job_details, pdf_path, metadata)
+                reason = None if job_details else "extraction returned no result"
+            except Exception as e:
+                job_details, reason = None, f"{type(e).__name__}: {e}"
+                print(f"Extraction of '{pdf_path}' failed: {e}")
+            finally:
+                if payload_bytes:
+                    extractor.byte_budget.release(payload_bytes)
+
+            output_path = None
+            if on_result is not None:
+                try:
+                    output_path = on_result(pdf_path, job_details, metadata)
+                except OSError as e:
+                    job_details, reason = None, f"could not write the result: {e}"
+            results[pdf_path] = job_details
+
+            if job_details:
+                recorded = queue.complete(pdf_path, model_name, str(output_path) if output_path else None, lease)
+            else:
+                recorded = queue.fail(pdf_path, model_name, reason, lease)
+            if not recorded:
+                print(f"Warning: the lease on '{pdf_path}' ran out and it was handed out again, "
+                      f"leaving its state to the worker that holds it now.")
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return results
+
+
+def _emit_validated(emit: Optional[Callable[[dict], None]], jobs: List[dict]):
+    """
+    Hands out streamed jobs normalized against JOB_SCHEMA, the way the assembled answer will hold them.
+    Jobs that do not fit the schema are not handed out.
+    """
+
+    if emit is None:
+        return
+    for job in jobs:
+        normalized = JOB_SCHEMA.validate([job])[0]
+        if normalized:
+            emit(normalized[0])
+
+
+def parse_job_array(job_details: Optional[str]) -> Optional[list]:
+    """
+    Parses the model's answer into a list of job objects.
+    Args: job_details (str | None): The JSON string returned by the extractor.
+    Returns: list | None: The job objects, or None if the answer is not a JSON array.
+    """
+
+    if not isinstance(job_details, str):
+        return None
+    try:
+        jobs = loads(job_details)
+    except json.JSONDecodeError:
+        return None
+    return jobs if isinstance(jobs, list) else None
+
+
+def _parse_json_object(content: Optional[str]) -> Optional[dict]:
+    """
+    Parses a model answer that should be a single JSON object, possibly wrapped in a code fence.
+    Args: content (str | None): The model's answer.
+    Returns: dict | None: The parsed object, or None if the answer is not a JSON object.
+    """
+
+    if not isinstance(content, str):
+        return None
+    try:
+        parsed = loads(slice_json(content))
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
 
-    if len(sys.argv) < 2:
-        print("Usage: python summarizer.py <path_to_pdf_file>")
-        sys.exit(1) 
-    pdf_file_path = sys.argv[1] 
+def score_job_details(job_details: Optional[str]) -> dict:
+    """
+    Scores an answer locally, without asking another model, by how much of the schema it fills in.
+    Args: job_details (str | None): The JSON string returned by the extractor.
+    Returns: dict: Whether the answer is a valid JSON array of job objects, the share of JOB_FIELDS present,
+    the share of present fields left as "not mentioned", and the overall score between 0 and 1:
+    completeness times the share of fields with actual content, or 0 for an invalid or empty answer.
+    """
+
+    jobs = parse_job_array(job_details)
+    if not jobs or not all(isinstance(job, dict) for job in jobs):
+        return {"valid": jobs is not None, "completeness": 0.0, "not_mentioned": 0.0, "score": 0.0}
+
+    present = sum(field in job for job in jobs for field in JOB_FIELDS)
+    missing = sum(field in job and _is_missing(job[field]) for job in jobs for field in JOB_FIELDS)
+    completeness = present / (len(jobs) * len(JOB_FIELDS))
+    not_mentioned = missing / present if present else 0.0
+    return {
+        "valid": True,
+        "completeness": round(completeness, 3),
+        "not_mentioned": round(not_mentioned, 3),
+        "score": round(completeness * (1 - not_mentioned), 3),
+    }
+
+
+def _is_missing(value) -> bool:
+    return value is None or str(value).strip().lower() in ("", "not mentioned")
+
+
+def _same_job(first: dict, second: dict) -> bool:
+    """
+    Decides whether two job objects from adjacent page ranges describe the same posting.
+    """
+
+    if not isinstance(first, dict) or not isinstance(second, dict):
+        return False
+    for field in ("Company name", "Job title", "Location"):
+        first_value, second_value = first.get(field), second.get(field)
+        if _is_missing(first_value) or _is_missing(second_value):
+            # A job cut by a page boundary often lacks some fields in one half, that alone is no mismatch
+            if field == "Job title":
+                return False
+            continue
+        if " ".join(str(first_value).lower().split()) != " ".join(str(second_value).lower().split()):
+            return False
+    return True
+
+
+def merge_job_chunks(chunk_jobs: List[list]) -> list:
+    """
+    Concatenates the job arrays of consecutive page ranges, merging a job that spans a range boundary into one object.
+    Args: chunk_jobs (list): The job arrays of each page range, in page order.
+    Returns: list: The merged job array.
+    """
+
+    merged: list = []
+    for jobs in chunk_jobs:
+        if merged and jobs and _same_job(merged[-1], jobs[0]):
+            boundary_job = dict(merged[-1])
+            for field, value in jobs[0].items():
+                if _is_missing(boundary_job.get(field)) and not _is_missing(value):
+                    boundary_job[field] = value
+            merged[-1] = boundary_job
+            jobs = jobs[1:]
+        merged.extend(jobs)
+    return merged
+
+
+def collect_pdf_paths(target: str) -> List[str]:
+    """
+    Resolves a CLI target to a sorted list of PDF paths.
+    Args: target (str): A PDF file, a directory containing PDFs, or a glob pattern.
+    Returns: list: The matching PDF paths.
+    """
+
+    path = Path(target)
+    if path.is_dir():
+        return sorted(str(p) for p in path.iterdir() if p.suffix.lower() == ".pdf")
+    if glob.has_magic(target):
+        return sorted(p for p in glob.glob(target) if Path(p).suffix.lower() == ".pdf")
+    return [target]
+
+
+def write_job_details(pdf_path: str, job_details: str, output_dir: str = "Output",
+                      metadata: Optional[dict] = None) -> Path:
+    """
+    Writes the extracted job details for a PDF to `<output_dir>/<pdf stem>.json`,
+    and the processing metadata, if any, next to it as `<pdf stem>.meta.json`.
+    Args: pdf_path (str): The path to the source PDF.
+    job_details (str): The JSON string returned by the extractor.
+    output_dir (str): The directory to write the output file into.
+    metadata (dict | None): Details about how the PDF was processed.
+    Returns: Path: The path of the written file.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_file_path = Path(output_dir) / f"{Path(pdf_path).stem}.json"
+
+    # Write the raw JSON string to the file
+    with open(output_file_path, "w", encoding="utf-8") as f:
+        f.write(job_details)
+
+    if metadata:
+        # Kept in a sidecar file so the output holds nothing but the job array
+        with open(Path(output_dir) / f"{Path(pdf_path).stem}.meta.json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=4)
+    return output_file_path
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Extract job posting details from PDF notices using OpenRouter.")
+    parser.add_argument("target", nargs="?", default=None,
+                        help="A PDF file, a directory of PDFs, or a glob pattern such as 'Input/*.pdf'")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Number of requests kept in flight when extracting several PDFs (default: 4)")
+    parser.add_argument("--output-dir", default="Output", help="Directory the JSON outputs are written to (default: Output)")
+    parser.add_argument("--write-metadata", action="store_true",
+                        help="Also write how each PDF was processed (engine, timings, usage, ...) to '<pdf stem>.meta.json'")
+    parser.add_argument("--model", default="deepseek/deepseek-chat", help="OpenRouter model to use")
+    parser.add_argument("--models", default=None,
+                        help="Comma-separated OpenRouter models to run in one pass, each writing to '<output dir> (<model>)'")
+    parser.add_argument("--pool-size", type=int, default=10,
+                        help="Maximum number of keep-alive connections to OpenRouter (default: 10)")
+    parser.add_argument("--pages-per-chunk", type=int, default=None,
+                        help="Split longer PDFs into ranges of this many pages and extract the ranges concurrently")
+    parser.add_argument("--pdf-engine", choices=("auto",) + PDF_ENGINES + (LOCAL_TEXT_ENGINE,), default=None,
+                        help="PDF engine to request; 'auto' checks each PDF for a text layer first (default: OpenRouter's choice)")
+    parser.add_argument("--text-layer-engine", choices=("pdf-text", LOCAL_TEXT_ENGINE), default="pdf-text",
+                        help="Engine 'auto' uses for PDFs with a text layer (default: pdf-text)")
+    parser.add_argument("--scanned-engine", choices=("mistral-ocr", "native"), default="mistral-ocr",
+                        help="Engine 'auto' uses for scanned PDFs (default: mistral-ocr)")
+    parser.add_argument("--requests-per-minute", type=float, default=None, help="Request budget per minute for OpenRouter calls")
+    parser.add_argument("--tokens-per-minute", type=float, default=None, help="Token budget per minute for OpenRouter calls")
+    parser.add_argument("--max-retries", type=int, default=5,
+                        help="How often a throttled or failed request is retried (default: 5)")
+    parser.add_argument("--connect-timeout", type=float, default=10.0,
+                        help="Seconds to wait for a connection to OpenRouter before retrying (default: 10)")
+    parser.add_argument("--read-timeout", type=float, default=300.0,
+                        help="Seconds to wait for the next bytes of an answer before retrying the request (default: 300)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream completions and append each job to '<output dir>/<pdf stem>.jsonl' as soon as it arrives")
+    parser.add_argument("--pack-bytes", type=int, default=None,
+                        help="Pack small PDFs into shared requests of up to this many bytes in total")
+    parser.add_argument("--pack-pages", type=int, default=None, help="Page budget of a packed request")
+    parser.add_argument("--pack-files", type=int, default=8, help="Most PDFs packed into one request (default: 8)")
+    parser.add_argument("--queue", default=None,
+                        help="SQLite file that records the progress of the batch, so it can be resumed after a crash")
+    parser.add_argument("--resume", action="store_true",
+                        help="With --queue, skip PDFs that already finished and retry only failed ones and the ones "
+                             "a stopped run left in flight")
+    parser.add_argument("--lease-seconds", type=float, default=900,
+                        help="With --queue, how long a PDF may stay in flight before it is handed out again (default: 900)")
+    # The default socket is resolved when the daemon starts, not every time the arguments are parsed
+    parser.add_argument("--serve", nargs="?", const="", default=None, metavar="SOCKET",
+                        help="Run as a daemon that keeps one extractor warm and serves client.py on this Unix socket "
+                             "(default socket: $JOBSUMMARIZER_SOCKET or a per-user one), or reads one target per line "
+                             "from stdin with '-'")
+    parser.add_argument("--watch", default=None, metavar="DIR",
+                        help="Keep running and extract every PDF that is added to or changed in this directory")
+    parser.add_argument("--watch-settle", type=float, default=1.0,
+                        help="With --watch, seconds a file must stay unchanged before it is picked up (default: 1)")
+    parser.add_argument("--watch-state", default=None,
+                        help="With --watch, the file recording the PDF contents already extracted (default: <output dir>/.processed.json)")
+    parser.add_argument("--cache-dir", default=".cache/responses", help="Directory of the response cache (default: .cache/responses)")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write cached responses")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached responses and replace them with fresh ones")
+    parser.add_argument("--hedge-model", default=None,
+                        help="Also send a PDF to this model when the main model is slower than usual; the first valid answer wins")
+    parser.add_argument("--hedge-percentile", type=float, default=95.0,
+                        help="With --hedge-model, hedge after this percentile of recent response times (default: 95)")
+    parser.add_argument("--hedge-delay", type=float, default=30.0,
+                        help="With --hedge-model, the hedge delay in seconds until enough response times are known (default: 30)")
+    parser.add_argument("--cascade-model", default=None,
+                        help="Stronger model to extract a PDF again with when the answer of --model scores below the threshold")
+    parser.add_argument("--cascade-threshold", type=float, default=0.6,
+                        help="With --cascade-model, the lowest answer score accepted without escalating, 0 to 1 (default: 0.6)")
+    parser.add_argument("--structured-output", action="store_true",
+                        help="Constrain answers with a JSON-schema response_format where the model supports it")
+    parser.add_argument("--schedule", choices=SCHEDULING_POLICIES, default="fifo",
+                        help="Order of the requests: 'fifo' as given, 'sjf' cheapest first by size, pages and scanning, "
+                             "'fair' weighted-fair turns between small and large PDFs (default: fifo)")
+    parser.add_argument("--schedule-aging", type=float, default=0.5,
+                        help="With --schedule sjf and --watch, how much a waiting PDF's estimated cost in seconds drops "
+                             "per second, so PDFs arriving later do not starve large ones (default: 0.5)")
+    parser.add_argument("--max-inflight-mb", type=float, default=None,
+                        help="Most megabytes of encoded request payloads uploaded at once across all models; "
+                             "larger PDFs wait for room (default: no limit)")
+    parser.add_argument("--max-continuations", type=int, default=3,
+                        help="How often an answer cut off by the output length limit is continued from its last complete job (default: 3)")
+    parser.add_argument("--cassette", default=None,
+                        help="Directory of recorded OpenRouter responses, to record new runs or replay them offline")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="auto",
+                        help="With --cassette: 'record' always calls OpenRouter, 'replay' never does, "
+                             "'auto' replays what is recorded and records the rest (default: auto)")
+    parser.add_argument("--metrics-jsonl", default=None, help="Append a metrics record per OpenRouter request to this JSONL file")
+    parser.add_argument("--metrics-prom", default=None,
+                        help="Keep per-model request totals in this Prometheus textfile, e.g. for node_exporter")
+    return parser
+
+
+def _make_extractor(args: argparse.Namespace, model_name: str, cache: Optional[ResponseCache],
+                    output_dir: str) -> JobPostingExtractor:
+    # Starts at the requested concurrency, the adaptive limit only backs off from there when throttled
+    rate_limiter = RateLimiter(args.requests_per_minute, args.tokens_per_minute, args.max_retries,
+                               initial_concurrency=max(args.concurrency, 1), max_concurrency=max(args.concurrency, 1))
+    return JobPostingExtractor(model_name=model_name, pool_size=args.pool_size,
+                               cache=cache, refresh_cache=args.refresh,
+                               pages_per_chunk=args.pages_per_chunk, pdf_engine=args.pdf_engine,
+                               text_layer_engine=args.text_layer_engine,
+                               scanned_engine=args.scanned_engine, rate_limiter=rate_limiter,
+                               stream=args.stream, jsonl_dir=output_dir if args.stream else None,
+                               pack_max_bytes=args.pack_bytes, pack_max_pages=args.pack_pages,
+                               pack_max_files=args.pack_files, on_request=args.on_request, cassette=args.cassette_store,
+                               hedge_model=args.hedge_model, hedge_percentile=args.hedge_percentile,
+                               hedge_delay=args.hedge_delay, cascade_model=args.cascade_model,
+                               cascade_threshold=args.cascade_threshold, structured_output=args.structured_output,
+                               max_continuations=args.max_continuations, schedule=args.schedule,
+                               byte_budget=args.byte_budget,
+                               request_timeout=(args.connect_timeout, args.read_timeout))
+
+
+def _run_single_model(args: argparse.Namespace, pdf_file_paths: List[str], cache: Optional[ResponseCache]):
+    with _make_extractor(args, args.model, cache, args.output_dir) as extractor:
+        if len(pdf_file_paths) == 1:
+            pdf_file_path = pdf_file_paths[0]
+            metadata: dict = {}
+            job_details = extractor.extract_job_details(pdf_file_path, metadata)
+
+            if job_details:
+                output_file_path = write_job_details(pdf_file_path, job_details, args.output_dir,
+                                                     metadata if args.write_metadata else None)
+                print(f"Extracted job details saved to: {output_file_path}")
+            else:
+                print("\nFailed to extract job details.")
+            return
+
+        def save_result(pdf_file_path: str, job_details: Optional[str], metadata: dict):
+            if job_details:
+                output_file_path = write_job_details(pdf_file_path, job_details, args.output_dir,
+                                                     metadata if args.write_metadata else None)
+                print(f"Extracted job details saved to: {output_file_path}")
+            else:
+                print(f"Failed to extract job details from: {pdf_file_path}")
+
+        results = asyncio.run(extractor.extract_many(pdf_file_paths, args.concurrency, on_result=save_result))
+        failed = [p for p, job_details in results.items() if not job_details]
+        print(f"\nProcessed {len(results)} PDFs, {len(results) - len(failed)} succeeded, {len(failed)} failed.")
+
+
+def _run_multiple_models(args: argparse.Namespace, pdf_file_paths: List[str], cache: Optional[ResponseCache],
+                         model_names: List[str]):
+    extractors = [_make_extractor(args, model_name, cache, model_output_dir(model_name, args.output_dir))
+                  for model_name in model_names]
+
+    def save_result(model_name: str, pdf_file_path: str, job_details: Optional[str], metadata: dict):
+        if job_details:
+            output_dir = model_output_dir(model_name, args.output_dir)
+            output_file_path = write_job_details(pdf_file_path, job_details, output_dir,
+                                                 metadata if args.write_metadata else None)
+            print(f"Extracted job details saved to: {output_file_path}")
+        else:
+            print(f"Failed to extract job details from {pdf_file_path} with {model_name}")
 
     try:
-        extractor = JobPostingExtractor() 
-        job_details = extractor.extract_job_details(pdf_file_path)
+        results = asyncio.run(extract_with_models(extractors, pdf_file_paths, args.concurrency, on_result=save_result,
+                                                 schedule=args.schedule))
+    finally:
+        for extractor in extractors:
+            extractor.close()
+
+    for model_name, model_results in results.items():
+        failed = [p for p, job_details in model_results.items() if not job_details]
+        print(f"{model_name}: {len(model_results) - len(failed)} of {len(model_results)} PDFs succeeded.")
+
+
+def serve_extraction_request(extractor: JobPostingExtractor, request: dict, concurrency: int,
+                             reply: Callable[[dict], None], write_metadata: bool = False):
+    """
+    Handles one request to the extraction daemon the way the command line handles its arguments.
+    Args: extractor (JobPostingExtractor): The daemon's extractor.
+    request (dict): "target" and "output_dir" as given on the command line, and "cwd", the directory they are relative to,
+    if not the daemon's own.
+    concurrency (int): The number of requests kept in flight when the target holds several PDFs.
+    reply (Callable): Receives {"message": ...} for every line the command line would print,
+    and finally {"event": "done", "status": ...} with its exit status.
+    write_metadata (bool): Whether to write each PDF's processing metadata next to its output, see write_job_details.
+    """
+
+    # Joining with "" leaves the paths as given, relative to the daemon's directory
+    cwd = request.get("cwd") or ""
+    target = request["target"]
+    output_dir = request.get("output_dir") or "Output"
+
+    def shown(path: str) -> str:
+        # Paths are reported as the command line would report them, relative to the caller's directory
+        return path if os.path.isabs(target) else os.path.relpath(path, cwd or os.curdir)
 
+    output = _request_output.get()
+    if output is not None and cwd and not os.path.isabs(target):
+        # The extractor's own messages name the resolved paths, which the client gave relative to its directory
+        output.relative_to(cwd)
+
+    pdf_file_paths = collect_pdf_paths(os.path.join(cwd, target))
+    if not pdf_file_paths:
+        reply({"message": f"No PDF files found for '{target}'."})
+        reply({"event": "done", "status": 1})
+        return
+
+    def save_result(pdf_file_path: str, job_details: Optional[str], metadata: dict):
         if job_details:
-            # Get the base name of the input PDF 
-            pdf_name = Path(pdf_file_path).stem
-            output_dir = "Output"
-            os.makedirs(output_dir, exist_ok=True)
-            output_file_path = Path(output_dir) / f"{pdf_name}.json"
-            
-            # Write the raw JSON string to the file
-            with open(output_file_path, "w", encoding="utf-8") as f:
-                f.write(job_details)
+            output_file_path = write_job_details(pdf_file_path, job_details, os.path.join(cwd, output_dir),
+                                                 metadata if write_metadata else None)
+            reply({"message": f"Extracted job details saved to: {Path(output_dir) / output_file_path.name}"})
+        elif len(pdf_file_paths) == 1:
+            reply({"message": "\nFailed to extract job details."})
+        else:
+            reply({"message": f"Failed to extract job details from: {shown(pdf_file_path)}"})
+
+    if len(pdf_file_paths) == 1:
+        metadata: dict = {}
+        save_result(pdf_file_paths[0], extractor.extract_job_details(pdf_file_paths[0], metadata), metadata)
+    else:
+        results = asyncio.run(extractor.extract_many(pdf_file_paths, concurrency, on_result=save_result))
+        failed = [p for p, job_details in results.items() if not job_details]
+        reply({"message": f"\nProcessed {len(results)} PDFs, {len(results) - len(failed)} succeeded, {len(failed)} failed."})
+    reply({"event": "done", "status": 0})
+
+
+# The daemon request the current thread prints on behalf of, if any
+_request_output: contextvars.ContextVar[Optional["_ClientOutput"]] = contextvars.ContextVar("request_output",
+                                                                                          default=None)
+
+
+class _ClientOutput:
+    """
+    Relays what is printed on behalf of a daemon request to its client, as one {"message": ...} reply per line
+    """
+
+    def __init__(self, reply: Callable[[dict], None]):
+        self.reply = reply
+        self._base: Optional[str] = None
+        # Kept per thread, so the prints of a request's concurrent extractions do not run into each other
+        self._partial_lines: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def relative_to(self, directory: str):
+        """
+        Shows the paths below a directory relative to it, as a command line started there would print them.
+        Args: directory (str): The client's working directory.
+        """
+
+        self._base = os.path.join(directory, "")
+
+    def _send(self, line: str):
+        if self._base is not None:
+            line = line.replace(self._base, "")
+        self.reply({"message": line})
+
+    def write(self, text: str):
+        with self._lock:
+            lines = (self._partial_lines.pop(threading.get_ident(), "") + text).split("\n")
+            if lines[-1]:
+                self._partial_lines[threading.get_ident()] = lines[-1]
+        for line in lines[:-1]:
+            self._send(line)
+
+    def flush(self):
+        with self._lock:
+            lines, self._partial_lines = list(self._partial_lines.values()), {}
+        for line in lines:
+            self._send(line)
+
+
+class _RoutedStdout:
+    """
+    Stands in for sys.stdout in the daemon: lines printed while serving a request go to its client,
+    everything else to the daemon's own output
+    """
+
+    def __init__(self, stdout: TextIO):
+        self._stdout = stdout
+
+    def write(self, text: str) -> int:
+        output = _request_output.get()
+        if output is None:
+            return self._stdout.write(text)
+        output.write(text)
+        return len(text)
+
+    def flush(self):
+        self._stdout.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stdout, name)
+
+
+class _ExtractionRequestHandler(socketserver.StreamRequestHandler):
+    server: "ExtractionServer"
+
+    def handle(self):
+        reply_lock = threading.Lock()
+        client_gone = threading.Event()
+
+        def reply(message: dict):
+            # Extractions running for the request reply from several threads
+            with reply_lock:
+                if client_gone.is_set():
+                    return
+                try:
+                    self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                except OSError:
+                    # The client went away, the results are written all the same
+                    client_gone.set()
+
+        output = _ClientOutput(reply)
+        token = _request_output.set(output)
+        try:
+            request = json.loads(self.rfile.readline())
+            serve_extraction_request(self.server.extractor, request, self.server.concurrency, reply,
+                                     self.server.write_metadata)
+            return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except Exception as e:
+            failure = e
+        finally:
+            output.flush()
+            _request_output.reset(token)
+        print(f"Daemon request failed: {failure}")
+        reply({"message": f"An unexpected error occurred: {failure}"})
+        reply({"event": "done", "status": 1})
+
+
+# socketserver only has Unix socket servers on platforms that have Unix sockets
+if hasattr(socket, "AF_UNIX"):
+    class ExtractionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """
+        A Unix socket server that answers client.py requests with one long-lived extractor, so each file costs
+        neither an interpreter start nor a cold connection. Requests are served concurrently and share the
+        extractor's rate limiter and connection pool.
+        """
+
+        daemon_threads = True
+
+        def __init__(self, socket_path: str, extractor: JobPostingExtractor, concurrency: int = 4,
+                     write_metadata: bool = False):
+            """
+            Initializes the ExtractionServer and binds its socket, replacing a stale one left by a crashed daemon.
+            Args: socket_path (str): The path of the Unix socket.
+            extractor (JobPostingExtractor): The extractor serving every request.
+            concurrency (int): The number of requests kept in flight for a target holding several PDFs.
+            write_metadata (bool): Whether to write each PDF's processing metadata next to its output.
+            """
+
+            self.extractor = extractor
+            self.concurrency = concurrency
+            self.write_metadata = write_metadata
+            if os.path.exists(socket_path):
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(socket_path)
+                except OSError:
+                    os.unlink(socket_path)
+                else:
+                    raise ValueError(f"Another daemon is already listening on {socket_path}")
+                finally:
+                    probe.close()
+            # Only the owner may connect, the daemon writes wherever its callers ask
+            old_umask = os.umask(0o177)
+            try:
+                super().__init__(socket_path, _ExtractionRequestHandler)
+            finally:
+                os.umask(old_umask)
+
+        def server_close(self):
+            super().server_close()
+            try:
+                os.unlink(self.server_address)
+            except OSError:
+                pass
+
+
+def _run_daemon(args: argparse.Namespace, cache: Optional[ResponseCache]):
+    if args.models or args.queue:
+        raise ValueError("--serve runs a single model and cannot be combined with --models or --queue.")
+    with _make_extractor(args, args.model, cache, args.output_dir) as extractor:
+        extractor._prepare_connections(args.concurrency, args.concurrency)
+        if args.serve == "-":
+            for line in sys.stdin:
+                if line.strip():
+                    serve_extraction_request(extractor, {"target": line.strip(), "output_dir": args.output_dir},
+                                             args.concurrency,
+                                             lambda reply: reply.get("message") is not None and print(reply["message"], flush=True),
+                                             args.write_metadata)
+            return
+
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("This platform has no Unix sockets, use '--serve -' to read targets from stdin instead.")
+        socket_path = args.serve or default_socket_path()
+        server = ExtractionServer(socket_path, extractor, args.concurrency, args.write_metadata)
+        # A plain kill shuts down as cleanly as Ctrl+C and removes the socket
+        signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        print(f"Extraction daemon listening on {socket_path}", flush=True)
+        # The extractor's errors and warnings reach the client that caused them, as they would on its command line
+        sys.stdout = _RoutedStdout(sys.stdout)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout = sys.stdout._stdout
+            server.server_close()
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _run_watch(args: argparse.Namespace, cache: Optional[ResponseCache]):
+    if args.models or args.queue or args.serve is not None:
+        raise ValueError("--watch runs a single model and cannot be combined with --models, --queue or --serve.")
+    processed = ProcessedFiles(args.watch_state or os.path.join(args.output_dir, ".processed.json"))
+    # Contents handed to a worker but not finished yet, so a copy landing meanwhile is not extracted twice
+    in_progress = set()
+    in_progress_lock = threading.Lock()
+
+    def extract(pdf_path: str, sha256: str):
+        try:
+            metadata: dict = {}
+            job_details = extractor.extract_job_details(pdf_path, metadata)
+            if job_details:
+                output_file_path = write_job_details(pdf_path, job_details, args.output_dir,
+                                                     metadata if args.write_metadata else None)
+                processed.add(sha256, str(output_file_path))
+                print(f"Extracted job details saved to: {output_file_path}", flush=True)
+            else:
+                print(f"Failed to extract job details from: {pdf_path}", flush=True)
+        except Exception as e:
+            print(f"Extraction of '{pdf_path}' failed: {e}", flush=True)
+        finally:
+            with in_progress_lock:
+                in_progress.discard(sha256)
+
+    # PDFs keep arriving while others wait for a worker, so the schedule and its aging decide which goes next
+    scheduler = BatchScheduler(args.schedule, args.schedule_aging)
+    # Counts the PDFs in the schedule, plus one wake-up per worker when stopping
+    scheduled = threading.Semaphore(0)
+    workers = max(1, args.concurrency)
+
+    def worker():
+        while True:
+            scheduled.acquire()
+            item = scheduler.pop()
+            if item is None:
+                return
+            extract(*item)
+
+    with _make_extractor(args, args.model, cache, args.output_dir) as extractor, \
+            DirectoryWatcher(args.watch, args.watch_settle) as watcher, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        extractor._prepare_connections(args.concurrency, args.concurrency)
+        for _ in range(workers):
+            executor.submit(worker)
+        signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        print(f"Watching '{args.watch}' for PDFs using {'inotify' if watcher.uses_inotify else 'polling'}, "
+              f"press Ctrl+C to stop.", flush=True)
+        try:
+            while True:
+                for pdf_path in watcher.wait():
+                    try:
+                        sha256 = sha256_file(pdf_path)
+                    except OSError as e:
+                        print(f"Warning: could not read '{pdf_path}': {e}")
+                        continue
+                    with in_progress_lock:
+                        if sha256 in processed or sha256 in in_progress:
+                            print(f"Skipping '{pdf_path}', its contents were already extracted.")
+                            continue
+                        in_progress.add(sha256)
+                    scheduler.push((pdf_path, sha256), estimate_cost([pdf_path]) if args.schedule != "fifo" else None)
+                    scheduled.release()
+        except KeyboardInterrupt:
+            print("Stopping, finishing the extractions in progress.", flush=True)
+        finally:
+            # The workers take what is left in the schedule first, then find it empty and stop
+            for _ in range(workers):
+                scheduled.release()
+
+
+def _run_queue(args: argparse.Namespace, pdf_file_paths: List[str], cache: Optional[ResponseCache],
+               model_names: List[str]):
+    queue = JobQueue(args.queue, args.lease_seconds)
+    output_dirs = {model_name: model_output_dir(model_name, args.output_dir) if args.models else args.output_dir
+                   for model_name in model_names}
+    extractors = [_make_extractor(args, model_name, cache, output_dirs[model_name]) for model_name in model_names]
+    for model_name in model_names:
+        queue.enqueue(pdf_file_paths, model_name, resume=args.resume)
+
+    def make_saver(model_name: str):
+        def save_result(pdf_file_path: str, job_details: Optional[str], metadata: dict) -> Optional[Path]:
+            if not job_details:
+                print(f"Failed to extract job details from {pdf_file_path} with {model_name}")
+                return None
+            output_file_path = write_job_details(pdf_file_path, job_details, output_dirs[model_name],
+                                                 metadata if args.write_metadata else None)
             print(f"Extracted job details saved to: {output_file_path}")
+            return output_file_path
+        return save_result
+
+    async def run_all():
+        await asyncio.gather(*(extract_from_queue(extractor, queue, args.concurrency,
+                                                  on_result=make_saver(extractor.model_name))
+                               for extractor in extractors))
+
+    try:
+        asyncio.run(run_all())
+    finally:
+        for extractor in extractors:
+            extractor.close()
+
+    for model_name in model_names:
+        counts = queue.counts(model_name, enqueued_only=True)
+        print(f"{model_name}: " + ", ".join(f"{count} {state}" for state, count in sorted(counts.items())))
+        for pdf_path, _, reason in queue.failures(model_name, enqueued_only=True):
+            print(f"  failed: {pdf_path} ({reason})")
+    queue.close()
+
+
+if __name__ == "__main__":
+    # pdf_file_path = "Input\\PDF5.pdf"
+
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+    if args.serve is None and args.watch is None:
+        if args.target is None:
+            parser.error("the target is required unless running as a daemon with --serve or watching with --watch")
+        pdf_file_paths = collect_pdf_paths(args.target)
+        if not pdf_file_paths:
+            print(f"No PDF files found for '{args.target}'.")
+            sys.exit(1)
+
+    try:
+        cache = None if args.no_cache else ResponseCache(args.cache_dir)
+        args.cassette_store = Cassette(args.cassette, args.cassette_mode) if args.cassette else None
+        # One budget for every model, the payloads of all of them share the machine's memory
+        args.byte_budget = ByteBudget(int(args.max_inflight_mb * 1024 * 1024)) if args.max_inflight_mb else None
+        # Shared by every extractor so the totals cover all models
+        args.on_request = fan_out([
+            JsonlMetricsWriter(args.metrics_jsonl) if args.metrics_jsonl else None,
+            PrometheusTextfileWriter(args.metrics_prom) if args.metrics_prom else None,
+        ])
+        model_names = [args.model]
+        if args.models:
+            model_names = [model_name.strip() for model_name in args.models.split(",") if model_name.strip()]
+
+        if args.watch is not None:
+            _run_watch(args, cache)
+        elif args.serve is not None:
+            _run_daemon(args, cache)
+        elif args.queue:
+            _run_queue(args, pdf_file_paths, cache, model_names)
+        elif args.models:
+            _run_multiple_models(args, pdf_file_paths, cache, model_names)
         else:
-            print("\nFailed to extract job details.")
+            _run_single_model(args, pdf_file_paths, cache)
+
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses.")
+        if args.cassette_store is not None:
+            stats = args.cassette_store.stats()
+            print(f"Cassette: {stats['replayed']} replayed, {stats['recorded']} recorded.")
+        if args.byte_budget is not None:
+            stats = args.byte_budget.stats()
+            print(f"Byte budget: peak {stats['peak_bytes'] / (1024 * 1024):.1f} of {stats['max_bytes'] / (1024 * 1024):.1f} MB "
+                  f"in flight, {stats['waits']} requests waited.")
 
     except ValueError as ve:
         print(f"Configuration Error: {ve}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-
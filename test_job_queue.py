@@ -0,0 +1,106 @@
+import time
+
+from job_queue import DONE, FAILED, IN_FLIGHT, PENDING, JobQueue
+
+MODEL = "deepseek/deepseek-chat"
+
+
+def make_queue(tmp_path, lease_seconds=900):
+    return JobQueue(str(tmp_path / "queue.db"), lease_seconds)
+
+
+def test_claim_hands_out_each_job_once(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(["a.pdf", "b.pdf"], MODEL)
+
+    assert queue.claim(MODEL) == ("a.pdf", 1)
+    assert queue.claim(MODEL) == ("b.pdf", 1)
+    assert queue.claim(MODEL) is None
+    assert queue.counts(MODEL) == {IN_FLIGHT: 2}
+
+
+def test_expired_lease_is_handed_out_again(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.enqueue(["a.pdf"], MODEL)
+
+    assert queue.claim(MODEL) == ("a.pdf", 1)
+    assert queue.claim(MODEL) is None
+    assert queue.next_lease_expiry(MODEL) <= time.time() + 0.05
+    time.sleep(0.1)
+    assert queue.claim(MODEL) == ("a.pdf", 2)
+
+
+def test_complete_and_fail_need_the_current_lease(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.enqueue(["a.pdf", "b.pdf"], MODEL)
+    _, stale_a = queue.claim(MODEL)
+    _, stale_b = queue.claim(MODEL)
+    time.sleep(0.1)
+    _, lease_a = queue.claim(MODEL)
+    _, lease_b = queue.claim(MODEL)
+
+    assert not queue.complete("a.pdf", MODEL, "Output/a.json", stale_a)
+    assert not queue.fail("b.pdf", MODEL, "timed out", stale_b)
+    assert queue.counts(MODEL) == {IN_FLIGHT: 2}
+
+    assert queue.complete("a.pdf", MODEL, "Output/a.json", lease_a)
+    assert queue.fail("b.pdf", MODEL, "timed out", lease_b)
+    assert not queue.complete("a.pdf", MODEL, "Output/a.json", lease_a)
+    assert queue.counts(MODEL) == {DONE: 1, FAILED: 1}
+    assert queue.failures(MODEL) == [("b.pdf", MODEL, "timed out")]
+
+
+def test_resume_requeues_failed_and_abandoned_jobs(tmp_path):
+    first_run = make_queue(tmp_path)
+    first_run.enqueue(["a.pdf", "b.pdf", "c.pdf"], MODEL)
+    first_run.complete(first_run.claim(MODEL)[0], MODEL)
+    first_run.fail(first_run.claim(MODEL)[0], MODEL, "no answer")
+    first_run.claim(MODEL)
+    first_run.close()
+
+    resumed = make_queue(tmp_path)
+    resumed.enqueue(["a.pdf", "b.pdf", "c.pdf"], MODEL, resume=True)
+    assert resumed.counts(MODEL) == {DONE: 1, PENDING: 2}
+    assert [resumed.claim(MODEL)[0] for _ in range(2)] == ["b.pdf", "c.pdf"]
+    assert resumed.claim(MODEL) is None
+
+
+def test_run_only_works_on_its_own_target(tmp_path):
+    first_run = make_queue(tmp_path)
+    first_run.enqueue(["a.pdf", "b.pdf", "c.pdf"], MODEL)
+    first_run.fail(first_run.claim(MODEL)[0], MODEL, "no answer")
+    first_run.claim(MODEL)
+    first_run.close()
+
+    resumed = make_queue(tmp_path)
+    resumed.enqueue(["c.pdf"], MODEL, resume=True)
+    assert resumed.claim(MODEL) == ("c.pdf", 1)
+    assert resumed.claim(MODEL) is None
+    resumed.complete("c.pdf", MODEL, None, 1)
+    # b.pdf is still leased by the first run, but it is not part of this one
+    assert resumed.next_lease_expiry(MODEL) is None
+    assert resumed.counts(MODEL) == {FAILED: 1, IN_FLIGHT: 1, DONE: 1}
+
+
+def test_enqueue_without_resume_starts_over(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(["a.pdf"], MODEL)
+    queue.complete(queue.claim(MODEL)[0], MODEL)
+
+    queue.enqueue(["a.pdf"], MODEL)
+    assert queue.claim(MODEL) == ("a.pdf", 1)
+
+
+def test_run_summary_counts_only_its_own_jobs(tmp_path):
+    first_run = make_queue(tmp_path)
+    first_run.enqueue(["a.pdf", "b.pdf"], MODEL)
+    first_run.fail(first_run.claim(MODEL)[0], MODEL, "no answer")
+    first_run.close()
+
+    second_run = make_queue(tmp_path)
+    second_run.enqueue(["b.pdf"], MODEL, resume=True)
+    second_run.complete(second_run.claim(MODEL)[0], MODEL)
+    assert second_run.counts(MODEL, enqueued_only=True) == {DONE: 1}
+    assert second_run.failures(MODEL, enqueued_only=True) == []
+    assert second_run.counts(MODEL) == {DONE: 1, FAILED: 1}
+    assert second_run.failures(MODEL) == [("a.pdf", MODEL, "no answer")]
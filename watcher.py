@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+# A complete PDF ends with this marker, possibly followed by a few bytes of whitespace or padding
+_EOF_MARKER = b"%%EOF"
+_EOF_WINDOW = 1024
+
+
+def _load_inotify() -> Optional[ctypes.CDLL]:
+    # Linux only; everywhere else, or if the C library cannot be loaded, the watcher polls instead
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def looks_complete(path: str) -> bool:
+    """
+    Checks whether a PDF has been written out completely, by the end-of-file marker near its end.
+    Args: path (str): The path to the PDF file.
+    Returns: bool: Whether the marker is there.
+    """
+
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - _EOF_WINDOW))
+            return _EOF_MARKER in f.read()
+    except OSError:
+        return False
+
+
+class DirectoryWatcher:
+    """
+    Watches a directory for PDFs that are new or changed and hands each one out once it has been written completely,
+    using inotify where available and polling the directory otherwise
+    """
+
+    def __init__(self, directory: str, settle_seconds: float = 1.0, poll_interval: float = 1.0,
+                 use_inotify: bool = True):
+        """
+        Initializes the DirectoryWatcher. PDFs already in the directory are handed out as well.
+        Args: directory (str): The directory to watch. Subdirectories are not watched.
+        settle_seconds (float): How long a file must stay unchanged before it counts as written, so copies
+        in progress are not picked up half way.
+        poll_interval (float): How often the directory is listed when inotify is not available.
+        use_inotify (bool): Whether to use inotify if the platform has it.
+        """
+
+        self.directory = directory
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        # Files seen changing: their last size and modification time, and when that last changed
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        # The size and modification time each file was handed out with, so polling does not hand it out again
+        self._handed_out: Dict[str, Tuple[int, int]] = {}
+        self._incomplete_reported = set()
+        self._next_poll = 0.0
+        self._fd: Optional[int] = None
+        if not os.path.isdir(directory):
+            raise ValueError(f"Cannot watch '{directory}': not a directory.")
+
+        libc = _load_inotify() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK) >= 0:
+                self._fd = fd
+            elif fd >= 0:
+                os.close(fd)
+            if self._fd is None:
+                print(f"Warning: inotify is not available ({os.strerror(ctypes.get_errno())}), "
+                      f"polling '{directory}' every {poll_interval:g}s instead.")
+        # Only what arrives before the watch was added needs a listing, inotify reports everything after
+        self._scan()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def _mark(self, path: str, now: Optional[float] = None):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Deleted or renamed away before it settled
+            self._pending.pop(path, None)
+            return
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self._handed_out.get(path) == signature:
+            return
+        previous = self._pending.get(path)
+        if previous is None or previous[0] != signature:
+            self._pending[path] = (signature, time.monotonic() if now is None else now)
+
+    def _scan(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(".pdf") and entry.is_file():
+                    self._mark(entry.path)
+
+    def _read_events(self, timeout: float):
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except InterruptedError:
+            return
+        if not readable:
+            return
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, a listing catches up with whatever they were about
+                self._scan()
+            elif name.lower().endswith(b".pdf"):
+                self._mark(os.path.join(self.directory, os.fsdecode(name)))
+
+    def _settled(self) -> List[str]:
+        now = time.monotonic()
+        ready = []
+        for path, (signature, changed) in list(self._pending.items()):
+            if now - changed < self.settle_seconds:
+                continue
+            # A writer that does not touch the file for a while still counts as writing if the size moved on
+            self._mark(path, now)
+            if path not in self._pending or self._pending[path][0] != signature:
+                continue
+            if not looks_complete(path):
+                if path not in self._incomplete_reported:
+                    print(f"Waiting for '{path}' to be written completely.")
+                    self._incomplete_reported.add(path)
+                self._pending[path] = (signature, now)
+                continue
+            del self._pending[path]
+            self._incomplete_reported.discard(path)
+            self._handed_out[path] = signature
+            ready.append(path)
+        return sorted(ready)
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        Blocks until at least one PDF is new or changed and written completely, or the timeout passes.
+        Args: timeout (float | None): The most seconds to wait, or None to wait indefinitely.
+        Returns: list: The paths of the PDFs that are ready, possibly none if the timeout passed.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ready = self._settled()
+            if ready:
+                return ready
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return []
+
+            # Wake up when the next pending file may have settled, or to check back on an incomplete one
+            wait_for = self.settle_seconds if self._pending else 3600.0
+            for _, changed in self._pending.values():
+                wait_for = min(wait_for, max(0.05, changed + self.settle_seconds - now))
+            if deadline is not None:
+                wait_for = min(wait_for, deadline - now)
+
+            if self._fd is not None:
+                self._read_events(wait_for)
+            else:
+                time.sleep(max(0.0, min(wait_for, self._next_poll - now)))
+                if time.monotonic() >= self._next_poll:
+                    self._scan()
+                    self._next_poll = time.monotonic() + self.poll_interval
+
+    def close(self):
+        """
+        Stops watching.
+        """
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ProcessedFiles:
+    """
+    A record of the PDF contents already extracted, by SHA-256, kept in a JSON file so restarts skip them too
+    """
+
+    def __init__(self, state_path: str):
+        """
+        Initializes the ProcessedFiles record, loading it if the file exists.
+        Args: state_path (str): The JSON file the record is kept in.
+        """
+
+        self.state_path = Path(state_path)
+        self._hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self._hashes = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: could not read '{state_path}', starting with no processed files: {e}")
+
+    def __contains__(self, sha256: str) -> bool:
+        with self._lock:
+            return sha256 in self._hashes
+
+    def add(self, sha256: str, output_path: str):
+        """
+        Records a PDF as extracted and saves the record.
+        Args: sha256 (str): The hash of the PDF's contents.
+        output_path (str): Where its job details were written.
+        """
+
+        with self._lock:
+            self._hashes[sha256] = output_path
+            os.makedirs(self.state_path.parent, exist_ok=True)
+            tmp_path = self.state_path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._hashes, f, indent=4)
+            os.replace(tmp_path, self.state_path)